@@ -0,0 +1,16 @@
+import time
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+def time_call(function, *args):
+    # Returns the result and the wall time of the call in milliseconds.
+    start = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+def format_latencies(latencies, fractions=(0.50, 0.95)) -> str:
+    values = latencies or [0.0]
+    return "  ".join(f"p{round(fraction * 100)}={percentile(values, fraction):7.2f}ms" for fraction in fractions)
@@ -0,0 +1,36 @@
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+def run_query(url: str, query: str) -> float:
+    start = time.perf_counter()
+    response = requests.post(f"{url}/v1/query", json={"query": query}, timeout=300)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+def run_level(url: str, query: str, concurrency: int) -> None:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(lambda _: run_query(url, query), range(concurrency)))
+    wall_time = time.perf_counter() - start
+    
+    print(
+        f"N={concurrency:3d}  wall={wall_time:7.2f}s  "
+        f"mean={statistics.mean(latencies):7.2f}s  max={max(latencies):7.2f}s  "
+        f"speedup_vs_serial={sum(latencies) / wall_time:5.2f}x"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent /v1/query benchmark for the orchestrator")
+    parser.add_argument("--url", default="http://localhost:8003")
+    parser.add_argument("--query", default="Hallo, wer bist du?")
+    parser.add_argument("--levels", default="1,2,4,8")
+    args = parser.parse_args()
+    
+    for level in args.levels.split(","):
+        run_level(args.url, args.query, int(level))
+
+if __name__ == "__main__":
+    main()
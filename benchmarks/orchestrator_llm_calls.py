@@ -0,0 +1,51 @@
+import argparse
+import statistics
+import time
+import requests
+
+DEFAULT_QUERIES = [
+    "Wie hoch ist meine Gebäudeversicherung?",
+    "Wann ist meine nächste Steuerfrist?",
+    "Wie hoch ist die Prämie der Gebäudeversicherung?",
+    "Wann ist mein nächster Arzttermin?",
+    "Was steht in meiner letzten Rechnung?",
+    "Hallo, wer bist du?",
+]
+
+def run_queries(url: str, queries: list, preroute: bool) -> None:
+    llm_calls = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        response = requests.post(
+            f"{url}/v1/query",
+            json={"query": query, "preroute": preroute, "use_cache": False},
+            timeout=300
+        )
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        llm_calls.append(response.json().get("llm_calls", 0))
+    
+    label = "with pre-routing" if preroute else "without pre-routing"
+    print(
+        f"{label:22s}  queries={len(queries)}  "
+        f"avg_llm_calls={statistics.mean(llm_calls):4.2f}  "
+        f"mean_latency={statistics.mean(latencies):6.2f}s  max_latency={max(latencies):6.2f}s"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Average LLM calls per query with and without fact pre-routing")
+    parser.add_argument("--url", default="http://localhost:8003")
+    parser.add_argument("--queries-file", help="One query per line, defaults to a built-in set")
+    args = parser.parse_args()
+    
+    queries = DEFAULT_QUERIES
+    if args.queries_file:
+        with open(args.queries_file, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    
+    run_queries(args.url, queries, preroute=False)
+    run_queries(args.url, queries, preroute=True)
+
+if __name__ == "__main__":
+    main()
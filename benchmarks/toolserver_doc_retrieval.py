@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import sys
+import uuid
+from bench_utils import format_latencies, time_call
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "doc_retrieval.json")
+
+def evaluate(label: str, search, queries: list, k: int) -> None:
+    # search(query, k) returns fixture ids in ranked order.
+    recalls = []
+    reciprocal_ranks = []
+    latencies = []
+    for item in queries:
+        ranked, latency = time_call(search, item["query"], k)
+        latencies.append(latency)
+        
+        relevant = set(item["relevant"])
+        recalls.append(len(relevant & set(ranked[:k])) / len(relevant))
+        rank = next((i + 1 for i, doc_id in enumerate(ranked) if doc_id in relevant), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    
+    print(
+        f"{label:8s}  recall@{k}={sum(recalls) / len(recalls):5.3f}  "
+        f"mrr={sum(reciprocal_ranks) / len(reciprocal_ranks):5.3f}  {format_latencies(latencies)}"
+    )
+
+def run_http(args, fixture) -> None:
+    import requests
+    
+    # The fixture is tagged with a run id and every query filters on it, so
+    # the benchmark can run against a collection that also holds real data.
+    run_id = uuid.uuid4().hex[:8]
+    response = requests.post(
+        f"{args.url}/v1/documents:batch",
+        json={"documents": [
+            {"text": document["text"], "metadata": {"benchmark": run_id, "fixture_id": document["id"]}}
+            for document in fixture["documents"]
+        ]},
+        timeout=120
+    )
+    response.raise_for_status()
+    ids = response.json()["ids"]
+    
+    try:
+        for mode in ("vector", "bm25", "hybrid"):
+            def search(query: str, k: int, mode=mode):
+                response = requests.post(
+                    f"{args.url}/v1/search",
+                    json={"query": query, "n_results": k, "where": {"benchmark": run_id}, "mode": mode},
+                    timeout=60
+                )
+                response.raise_for_status()
+                return [result["metadata"]["fixture_id"] for result in response.json()["results"]]
+            
+            evaluate(mode, search, fixture["queries"], args.k)
+    finally:
+        requests.post(f"{args.url}/v1/documents:batchDelete", json={"ids": ids}, timeout=60)
+
+def run_local(args, fixture) -> None:
+    # Lexical part only, runs without Chroma.
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "services", "toolserver", "app"))
+    from doc_index import DocIndex
+    
+    index = DocIndex()
+    index.replace(fixture["documents"])
+    
+    def search(query: str, k: int):
+        return [doc_id for doc_id, _ in index.search(query, k)]
+    
+    evaluate("bm25", search, fixture["queries"], args.k)
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality and latency of vector, BM25 and hybrid document search")
+    parser.add_argument("--mode", choices=["http", "local"], default="http")
+    parser.add_argument("--url", default="http://localhost:8002")
+    parser.add_argument("--fixture", default=FIXTURE_PATH)
+    parser.add_argument("-k", type=int, default=3, help="Results per query")
+    args = parser.parse_args()
+    
+    with open(args.fixture, "r", encoding="utf-8") as f:
+        fixture = json.load(f)
+    
+    if args.mode == "http":
+        run_http(args, fixture)
+    else:
+        run_local(args, fixture)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bench_utils import format_latencies, time_call
+
+def run_mixed(read_one, write_one, readers: int, writers: int, operations: int) -> None:
+    latencies = {"read": [], "write": []}
+    errors = {"read": 0, "write": 0}
+    lock = threading.Lock()
+    
+    def worker(kind: str, index: int):
+        for i in range(operations):
+            try:
+                if kind == "read":
+                    _, latency = time_call(read_one, f"bench.{i % 50}")
+                else:
+                    _, latency = time_call(write_one, f"bench.{(index * operations + i) % 50}", str(i))
+            except Exception:
+                with lock:
+                    errors[kind] += 1
+                continue
+            with lock:
+                latencies[kind].append(latency)
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=readers + writers) as executor:
+        futures = [executor.submit(worker, "read", i) for i in range(readers)]
+        futures += [executor.submit(worker, "write", i) for i in range(writers)]
+        for future in futures:
+            future.result()
+    wall_time = time.perf_counter() - start
+    
+    for kind in ("read", "write"):
+        print(
+            f"  {kind:5s}  ops/s={len(latencies[kind]) / wall_time:8.1f}  "
+            f"{format_latencies(latencies[kind])}  errors={errors[kind]}"
+        )
+
+def run_http(args) -> None:
+    import requests
+    
+    session = requests.Session()
+    for i in range(50):
+        session.put(f"{args.url}/v1/facts/bench.{i}", json={"value": "0"}, timeout=30).raise_for_status()
+    
+    def read_one(key: str):
+        session.get(f"{args.url}/v1/facts/{key}", timeout=30).raise_for_status()
+    
+    def write_one(key: str, value: str):
+        session.put(f"{args.url}/v1/facts/{key}", json={"value": value}, timeout=30).raise_for_status()
+    
+    print(f"HTTP {args.url}  readers={args.readers} writers={args.writers}")
+    run_mixed(read_one, write_one, args.readers, args.writers, args.operations)
+
+def run_local(args) -> None:
+    # Compares the previous storage setup (default engine, one commit per
+    # write from every thread) with the tuned storage layer on temp files.
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "services", "toolserver", "app"))
+    directory = tempfile.mkdtemp(prefix="facts-bench-")
+    
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from models import Base, Fact
+    
+    baseline_engine = create_engine(
+        f"sqlite:///{os.path.join(directory, 'baseline.db')}",
+        connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(bind=baseline_engine)
+    BaselineSession = sessionmaker(bind=baseline_engine)
+    
+    def baseline_read(key: str):
+        db = BaselineSession()
+        try:
+            db.query(Fact).filter(Fact.key == key).first()
+        finally:
+            db.close()
+    
+    def baseline_write(key: str, value: str):
+        db = BaselineSession()
+        try:
+            fact = db.query(Fact).filter(Fact.key == key).first()
+            if fact:
+                fact.value = value
+            else:
+                db.add(Fact(key=key, value=value))
+            db.commit()
+        finally:
+            db.close()
+    
+    print(f"baseline (default engine)  readers={args.readers} writers={args.writers}")
+    run_mixed(baseline_read, baseline_write, args.readers, args.writers, args.operations)
+    
+    os.environ["FACTS_DB_PATH"] = os.path.join(directory, "tuned.db")
+    import database
+    
+    database.init_db()
+    
+    def tuned_read(key: str):
+        db = database.SessionLocal()
+        try:
+            database.get_fact(db, key)
+        finally:
+            db.close()
+    
+    print(f"tuned (WAL + writer thread)  readers={args.readers} writers={args.writers}")
+    run_mixed(tuned_read, database.set_fact, args.readers, args.writers, args.operations)
+    print(f"  writer: {database.fact_writer.metrics()}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent read/write benchmark for the facts store")
+    parser.add_argument("--mode", choices=["http", "local"], default="http")
+    parser.add_argument("--url", default="http://localhost:8002")
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--operations", type=int, default=200, help="Operations per thread")
+    args = parser.parse_args()
+    
+    if args.mode == "http":
+        run_http(args)
+    else:
+        run_local(args)
+
+if __name__ == "__main__":
+    main()
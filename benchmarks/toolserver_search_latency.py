@@ -0,0 +1,77 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+from bench_utils import format_latencies, time_call
+
+def measure(label: str, search, requests: int, warmup: int) -> None:
+    for _ in range(warmup):
+        search()
+    
+    latencies = [time_call(search)[1] for _ in range(requests)]
+    print(
+        f"{label:28s}  requests={len(latencies)}  mean={statistics.mean(latencies):7.2f}ms  "
+        f"{format_latencies(latencies, (0.50, 0.95, 0.99))}"
+    )
+
+def run_http(args) -> None:
+    import requests
+    
+    session = requests.Session()
+    payload = {"query": args.query, "n_results": 5}
+    
+    def search():
+        session.post(f"{args.url}/v1/search", json=payload, timeout=30).raise_for_status()
+    
+    measure(f"HTTP {args.url}", search, args.requests, args.warmup)
+
+def run_local(args) -> None:
+    # Compares the previous client handling (new client, heartbeat and
+    # collection lookup per search) with the shared handle, both against the
+    # same Chroma instance. Only the embedding query is timed.
+    os.environ["CHROMA_HOST"] = args.chroma
+    os.environ.setdefault("FACTS_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="search-bench-"), "facts.db"))
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "services", "toolserver", "app"))
+    
+    import chromadb
+    from chromadb.config import Settings
+    import tools
+    
+    host = args.chroma.replace("http://", "").replace("https://", "").split(":")[0]
+    port_str = args.chroma.split(":")[-1]
+    port = int(port_str) if port_str.isdigit() else 8000
+    
+    def baseline_search():
+        client = chromadb.HttpClient(
+            host=host,
+            port=port,
+            settings=Settings(anonymized_telemetry=False, allow_reset=True)
+        )
+        client.heartbeat()
+        collection = client.get_collection(name=tools.CHROMA_COLLECTION)
+        collection.query(query_texts=[args.query], n_results=5)
+    
+    def shared_search():
+        tools.with_collection(lambda collection: collection.query(query_texts=[args.query], n_results=5))
+    
+    measure("baseline (client per search)", baseline_search, args.requests, args.warmup)
+    measure("shared client and collection", shared_search, args.requests, args.warmup)
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency benchmark for toolserver document search")
+    parser.add_argument("--mode", choices=["http", "local"], default="http")
+    parser.add_argument("--url", default="http://localhost:8002")
+    parser.add_argument("--chroma", default="http://localhost:8000", help="Chroma URL for --mode local")
+    parser.add_argument("--query", default="Versicherung")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+    
+    if args.mode == "http":
+        run_http(args)
+    else:
+        run_local(args)
+
+if __name__ == "__main__":
+    main()
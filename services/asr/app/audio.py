@@ -0,0 +1,37 @@
+import io
+import wave
+import numpy as np
+from faster_whisper import decode_audio
+from typing import Optional
+
+SAMPLE_RATE = 16000
+RAW_PCM_CONTENT_TYPES = {"audio/pcm", "audio/l16", "audio/x-raw"}
+
+def pcm16_to_float32(data: bytes, channels: int = 1) -> np.ndarray:
+    samples = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples
+
+def read_wav_fast_path(content: bytes) -> Optional[np.ndarray]:
+    # 16 kHz 16-bit PCM WAV is already what Whisper needs, so it can skip
+    # the ffmpeg/PyAV decoder entirely.
+    if not content.startswith(b"RIFF") or content[8:12] != b"WAVE":
+        return None
+    try:
+        with wave.open(io.BytesIO(content), "rb") as wav:
+            if wav.getframerate() != SAMPLE_RATE or wav.getsampwidth() != 2 or wav.getcomptype() != "NONE":
+                return None
+            return pcm16_to_float32(wav.readframes(wav.getnframes()), wav.getnchannels())
+    except wave.Error:
+        return None
+
+def decode_audio_bytes(content: bytes, content_type: Optional[str] = None) -> np.ndarray:
+    if content_type and content_type.split(";")[0].strip().lower() in RAW_PCM_CONTENT_TYPES:
+        return pcm16_to_float32(content[:len(content) - len(content) % 2])
+    
+    samples = read_wav_fast_path(content)
+    if samples is not None:
+        return samples
+    
+    return decode_audio(io.BytesIO(content), sampling_rate=SAMPLE_RATE)
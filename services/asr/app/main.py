@@ -1,12 +1,101 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from faster_whisper import WhisperModel
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import os
+import numpy as np
+from audio import decode_audio_bytes
+from streaming import StreamingTranscriber
 from pydantic import BaseModel
 from typing import Optional
 
-app = FastAPI(title="Jarvis ASR Service", version="1.0.0")
+ASR_MODEL_SIZE = os.getenv("ASR_MODEL_SIZE", "small")
+ASR_CPU_THREADS = int(os.getenv("ASR_CPU_THREADS", "2"))
+ASR_WORKERS = int(os.getenv("ASR_WORKERS", str(max(1, (os.cpu_count() or 1) // ASR_CPU_THREADS))))
+ASR_MAX_QUEUE = int(os.getenv("ASR_MAX_QUEUE", str(ASR_WORKERS * 4)))
+
+class ModelPool:
+    def __init__(self, size: int, max_queue: int):
+        self.size = size
+        self.max_queue = max_queue
+        self.models: asyncio.Queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="whisper")
+        self.waiting = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+    
+    def load(self):
+        for index in range(self.size):
+            print(f"Loading Whisper model {index + 1}/{self.size}...")
+            self.models.put_nowait(WhisperModel(
+                ASR_MODEL_SIZE,
+                device="cpu",
+                compute_type="int8",
+                cpu_threads=ASR_CPU_THREADS
+            ))
+        print("Whisper models loaded successfully")
+    
+    def is_saturated(self) -> bool:
+        return self.waiting >= self.max_queue
+    
+    def has_idle_worker(self) -> bool:
+        return self.waiting == 0 and self.active < self.size
+    
+    async def run(self, function, *args):
+        self.waiting += 1
+        try:
+            model = await self.models.get()
+        finally:
+            self.waiting -= 1
+        
+        # The model goes back to the pool only once the worker thread is done
+        # with it, even if the waiting request was cancelled in the meantime.
+        loop = asyncio.get_running_loop()
+        self.active += 1
+        future = self.executor.submit(function, model, *args)
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._release, model, f))
+        return await asyncio.wrap_future(future)
+    
+    def _release(self, model, future):
+        self.active -= 1
+        if future.cancelled() or future.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+        self.models.put_nowait(model)
+    
+    def metrics(self) -> dict:
+        return {
+            "workers": self.size,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected
+        }
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+model_pool: Optional[ModelPool] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global model_pool
+    model_pool = ModelPool(ASR_WORKERS, ASR_MAX_QUEUE)
+    await asyncio.get_running_loop().run_in_executor(None, model_pool.load)
+    
+    yield
+    
+    model_pool.shutdown()
+
+app = FastAPI(title="Jarvis ASR Service", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,10 +105,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-print("Loading Whisper model...")
-model = WhisperModel("small", device="cpu", compute_type="int8")
-print("Whisper model loaded successfully")
-
 class TranscriptionResponse(BaseModel):
     text: str
     language: str
@@ -31,37 +116,93 @@ def root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "model": "faster-whisper-small"}
+    return {"status": "healthy", "model": f"faster-whisper-{ASR_MODEL_SIZE}"}
+
+@app.get("/v1/metrics")
+def get_metrics():
+    return model_pool.metrics()
+
+def transcribe_samples(model: WhisperModel, audio: np.ndarray, beam_size: int = 5) -> tuple[str, str, float]:
+    segments, info = model.transcribe(
+        audio,
+        language="de",
+        beam_size=beam_size,
+        vad_filter=True
+    )
+    
+    full_text = " ".join([segment.text for segment in segments])
+    return full_text, info.language, info.duration
+
+def run_transcription(model: WhisperModel, content: bytes, content_type: Optional[str]) -> tuple[str, str, float]:
+    return transcribe_samples(model, decode_audio_bytes(content, content_type))
 
 @app.post("/v1/transcribe", response_model=TranscriptionResponse)
 async def transcribe_audio(file: UploadFile = File(...)):
     if not file:
         raise HTTPException(status_code=400, detail="Keine Datei hochgeladen")
     
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-        content = await file.read()
-        temp_file.write(content)
-        temp_file_path = temp_file.name
+    if model_pool.is_saturated():
+        model_pool.rejected += 1
+        raise HTTPException(
+            status_code=503,
+            detail="Spracherkennung ausgelastet, bitte später erneut versuchen",
+            headers={"Retry-After": "1"}
+        )
+    
+    content = await file.read()
+    if not content:
+        raise HTTPException(status_code=400, detail="Leere Audiodatei")
     
     try:
-        segments, info = model.transcribe(
-            temp_file_path,
-            language="de",
-            beam_size=5,
-            vad_filter=True
-        )
-        
-        full_text = " ".join([segment.text for segment in segments])
+        full_text, language, duration = await model_pool.run(run_transcription, content, file.content_type)
         
         return TranscriptionResponse(
             text=full_text.strip(),
-            language=info.language,
-            duration=info.duration
+            language=language,
+            duration=duration
         )
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Fehler bei der Transkription: {str(e)}")
+
+@app.websocket("/v1/transcribe/stream")
+async def transcribe_stream(websocket: WebSocket):
+    await websocket.accept()
     
-    finally:
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+    if model_pool.is_saturated():
+        model_pool.rejected += 1
+        await websocket.send_json({"type": "error", "detail": "Spracherkennung ausgelastet, bitte später erneut versuchen"})
+        await websocket.close(code=1013)
+        return
+    
+    async def transcribe(audio: np.ndarray, partial: bool) -> str:
+        text, _, _ = await model_pool.run(transcribe_samples, audio, 1 if partial else 5)
+        return text
+    
+    transcriber = StreamingTranscriber(transcribe, can_run_partial=model_pool.has_idle_worker)
+    
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            if message.get("bytes"):
+                for event in await transcriber.feed(message["bytes"]):
+                    await websocket.send_json(event)
+            
+            elif message.get("text"):
+                control = json.loads(message["text"])
+                if control.get("type") == "end":
+                    for event in await transcriber.finish():
+                        await websocket.send_json(event)
+                    await websocket.send_json({"type": "end"})
+                    await websocket.close()
+                    break
+    
+    except WebSocketDisconnect:
+        pass
+    
+    except Exception as e:
+        await websocket.send_json({"type": "error", "detail": f"Fehler bei der Transkription: {str(e)}"})
+        await websocket.close(code=1011)
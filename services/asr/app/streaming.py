@@ -0,0 +1,110 @@
+import os
+import numpy as np
+from typing import Awaitable, Callable, Dict, Any, List
+from audio import SAMPLE_RATE, pcm16_to_float32
+
+STREAM_FRAME_MS = 30
+STREAM_VAD_THRESHOLD = float(os.getenv("ASR_STREAM_VAD_THRESHOLD", "0.01"))
+STREAM_SILENCE_MS = int(os.getenv("ASR_STREAM_SILENCE_MS", "600"))
+STREAM_PARTIAL_INTERVAL_MS = int(os.getenv("ASR_STREAM_PARTIAL_INTERVAL_MS", "1000"))
+STREAM_MAX_SEGMENT_S = float(os.getenv("ASR_STREAM_MAX_SEGMENT_S", "30"))
+STREAM_PADDING_MS = 200
+
+Transcribe = Callable[[np.ndarray, bool], Awaitable[str]]
+
+class StreamingTranscriber:
+    # Receives 16 kHz mono PCM16 chunks, splits them into utterances with an
+    # energy VAD and emits partial transcripts while speech is ongoing and a
+    # final transcript as soon as the trailing silence is long enough.
+    def __init__(self, transcribe: Transcribe, can_run_partial: Callable[[], bool]):
+        self.transcribe = transcribe
+        self.can_run_partial = can_run_partial
+        
+        self.frame_size = SAMPLE_RATE * STREAM_FRAME_MS // 1000
+        self.silence_frames_to_end = max(1, STREAM_SILENCE_MS // STREAM_FRAME_MS)
+        self.partial_interval = SAMPLE_RATE * STREAM_PARTIAL_INTERVAL_MS // 1000
+        self.max_segment_samples = int(SAMPLE_RATE * STREAM_MAX_SEGMENT_S)
+        self.padding_frames = max(1, STREAM_PADDING_MS // STREAM_FRAME_MS)
+        
+        self.remainder = b""
+        self.leading: List[np.ndarray] = []
+        self.segment: List[np.ndarray] = []
+        self.segment_samples = 0
+        self.silent_frames = 0
+        self.samples_since_partial = 0
+        self.last_partial = ""
+    
+    async def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        data = self.remainder + chunk
+        frame_bytes = self.frame_size * 2
+        usable = len(data) - len(data) % frame_bytes
+        self.remainder = data[usable:]
+        
+        events = []
+        samples = pcm16_to_float32(data[:usable])
+        for start in range(0, len(samples), self.frame_size):
+            event = await self._process_frame(samples[start:start + self.frame_size])
+            if event:
+                events.append(event)
+        
+        if self.segment and self.samples_since_partial >= self.partial_interval and self.can_run_partial():
+            self.samples_since_partial = 0
+            text = (await self.transcribe(self._segment_audio(), True)).strip()
+            if text and text != self.last_partial:
+                self.last_partial = text
+                events.append({"type": "partial", "text": text})
+        
+        return events
+    
+    async def finish(self) -> List[Dict[str, Any]]:
+        events = []
+        if self.remainder:
+            events.extend(await self.feed(b"\x00" * (self.frame_size * 2 - len(self.remainder))))
+        
+        event = await self._finalize()
+        if event:
+            events.append(event)
+        return events
+    
+    async def _process_frame(self, frame: np.ndarray):
+        is_speech = float(np.sqrt(np.mean(frame ** 2))) >= STREAM_VAD_THRESHOLD
+        
+        if not self.segment:
+            # Keep a little audio before speech onset so the first syllable
+            # is not cut off.
+            self.leading = (self.leading + [frame])[-self.padding_frames:]
+            if is_speech:
+                self.segment = list(self.leading)
+                self.segment_samples = sum(len(f) for f in self.segment)
+                self.leading = []
+                self.silent_frames = 0
+            return None
+        
+        self.segment.append(frame)
+        self.segment_samples += len(frame)
+        self.samples_since_partial += len(frame)
+        self.silent_frames = 0 if is_speech else self.silent_frames + 1
+        
+        if self.silent_frames >= self.silence_frames_to_end or self.segment_samples >= self.max_segment_samples:
+            return await self._finalize()
+        return None
+    
+    async def _finalize(self):
+        if not self.segment:
+            return None
+        
+        audio = self._segment_audio()
+        duration = len(audio) / SAMPLE_RATE
+        self.segment = []
+        self.segment_samples = 0
+        self.silent_frames = 0
+        self.samples_since_partial = 0
+        self.last_partial = ""
+        
+        text = (await self.transcribe(audio, False)).strip()
+        if not text:
+            return None
+        return {"type": "final", "text": text, "duration": duration}
+    
+    def _segment_audio(self) -> np.ndarray:
+        return np.concatenate(self.segment)
@@ -7,9 +7,14 @@ import { useToast } from '@/hooks/use-toast';
 import { listFacts, setFact, deleteFact, Fact } from '../services/api';
 import { Plus, Trash2, Edit, Loader2 } from 'lucide-react';
 
+const PAGE_SIZE = 100;
+
 export function FactsManager() {
   const [facts, setFacts] = useState<Fact[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [prefix, setPrefix] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [isDialogOpen, setIsDialogOpen] = useState(false);
   const [editingFact, setEditingFact] = useState<Fact | null>(null);
   const [newKey, setNewKey] = useState('');
@@ -17,14 +22,24 @@ export function FactsManager() {
   const { toast } = useToast();
 
   useEffect(() => {
-    loadFacts();
-  }, []);
+    const timeout = setTimeout(() => loadFacts(), 300);
+    return () => clearTimeout(timeout);
+  }, [prefix]);
+
+  const fetchPage = (cursor: string | null) =>
+    listFacts({
+      prefix: prefix.trim() || undefined,
+      limit: PAGE_SIZE,
+      cursor,
+      fields: ['key', 'value', 'updated_at'],
+    });
 
   const loadFacts = async () => {
     setIsLoading(true);
     try {
-      const data = await listFacts();
-      setFacts(data);
+      const page = await fetchPage(null);
+      setFacts(page.facts);
+      setNextCursor(page.nextCursor);
     } catch (error) {
       toast({
         title: 'Fehler',
@@ -36,6 +51,24 @@ export function FactsManager() {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setIsLoadingMore(true);
+    try {
+      const page = await fetchPage(nextCursor);
+      setFacts((current) => [...current, ...page.facts]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      toast({
+        title: 'Fehler',
+        description: error instanceof Error ? error.message : 'Fakten konnten nicht geladen werden',
+        variant: 'destructive',
+      });
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   const handleSave = async () => {
     if (!newKey.trim() || !newValue.trim()) {
       toast({
@@ -145,6 +178,13 @@ export function FactsManager() {
         </Dialog>
       </div>
 
+      <Input
+        value={prefix}
+        onChange={(e) => setPrefix(e.target.value)}
+        placeholder="Nach Schlüssel-Präfix filtern, z.B. versicherung."
+        className="bg-gray-800 border-gray-700 text-white"
+      />
+
       {isLoading ? (
         <div className="flex justify-center py-8">
           <Loader2 className="w-8 h-8 animate-spin text-blue-500" />
@@ -188,6 +228,17 @@ export function FactsManager() {
               </div>
             </Card>
           ))}
+          {nextCursor && (
+            <Button
+              variant="outline"
+              onClick={loadMore}
+              disabled={isLoadingMore}
+              className="border-gray-700"
+            >
+              {isLoadingMore && <Loader2 className="w-4 h-4 mr-2 animate-spin" />}
+              Mehr laden
+            </Button>
+          )}
         </div>
       )}
     </div>
@@ -87,14 +87,31 @@ export interface Fact {
   updated_at?: string;
 }
 
-export async function listFacts(): Promise<Fact[]> {
-  const response = await fetch(`${TOOLSERVER_URL}/v1/facts`);
+export interface FactPage {
+  facts: Fact[];
+  nextCursor: string | null;
+}
+
+export async function listFacts(
+  options: { prefix?: string; limit?: number; cursor?: string | null; fields?: string[] } = {}
+): Promise<FactPage> {
+  const params = new URLSearchParams();
+  if (options.prefix) params.set('prefix', options.prefix);
+  if (options.limit) params.set('limit', String(options.limit));
+  if (options.cursor) params.set('cursor', options.cursor);
+  if (options.fields) params.set('fields', options.fields.join(','));
+  
+  const query = params.toString();
+  const response = await fetch(`${TOOLSERVER_URL}/v1/facts${query ? `?${query}` : ''}`);
   
   if (!response.ok) {
     throw new Error(`Toolserver error: ${response.statusText}`);
   }
   
-  return response.json();
+  return {
+    facts: await response.json(),
+    nextCursor: response.headers.get('X-Next-Cursor'),
+  };
 }
 
 export async function getFact(key: string): Promise<Fact> {
@@ -0,0 +1,75 @@
+import re
+from typing import List
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+
+class TextChunker:
+    def __init__(self, strategy: str = "sentence", chunk_size: int = 300, overlap: int = 50):
+        if strategy not in ("sentence", "token"):
+            raise ValueError(f"Unknown chunk strategy: {strategy}")
+        if chunk_size <= 0 or overlap < 0 or overlap >= chunk_size:
+            raise ValueError("chunk_size must be positive and larger than overlap")
+        
+        self.strategy = strategy
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+    
+    def chunk(self, text: str) -> List[str]:
+        if self.strategy == "token":
+            return self._chunk_tokens(text.split())
+        return self._chunk_sentences(text)
+    
+    def _chunk_tokens(self, words: List[str]) -> List[str]:
+        chunks = []
+        step = self.chunk_size - self.overlap
+        
+        for start in range(0, len(words), step):
+            chunks.append(" ".join(words[start:start + self.chunk_size]))
+            if start + self.chunk_size >= len(words):
+                break
+        
+        return chunks
+    
+    def _chunk_sentences(self, text: str) -> List[str]:
+        sentences = [s.strip() for s in SENTENCE_BOUNDARY.split(text) if s and s.strip()]
+        
+        chunks = []
+        current: List[str] = []
+        current_length = 0
+        
+        for sentence in sentences:
+            words = sentence.split()
+            
+            if len(words) > self.chunk_size:
+                if current:
+                    chunks.append(" ".join(current))
+                    current, current_length = [], 0
+                chunks.extend(self._chunk_tokens(words))
+                continue
+            
+            if current and current_length + len(words) > self.chunk_size:
+                chunks.append(" ".join(current))
+                current, current_length = self._overlap_tail(current, len(words))
+            
+            current.append(sentence)
+            current_length += len(words)
+        
+        if current:
+            chunks.append(" ".join(current))
+        
+        return chunks
+    
+    def _overlap_tail(self, sentences: List[str], next_length: int) -> tuple[List[str], int]:
+        # Carry whole trailing sentences into the next chunk, up to `overlap`
+        # words, as long as the next sentence still fits.
+        tail: List[str] = []
+        tail_length = 0
+        
+        for sentence in reversed(sentences):
+            length = len(sentence.split())
+            if tail_length + length > self.overlap or tail_length + length + next_length > self.chunk_size:
+                break
+            tail.insert(0, sentence)
+            tail_length += length
+        
+        return tail, tail_length
@@ -1,22 +1,45 @@
 import os
+import time
 import logging
 import requests
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 import PyPDF2
 import docx
 import pytesseract
 from PIL import Image
+from chunker import TextChunker
 
 logger = logging.getLogger(__name__)
 
 TOOLSERVER_URL = os.getenv("TOOLSERVER_URL", "http://toolserver:8002")
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "sentence")
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "300"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
+UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", "64"))
+
+SUPPORTED_EXTENSIONS = {'.pdf', '.docx', '.doc', '.txt', '.png', '.jpg', '.jpeg', '.tiff'}
+
+def is_supported_file(file_path: str) -> bool:
+    return Path(file_path).suffix.lower() in SUPPORTED_EXTENSIONS
 
 class DocumentProcessor:
     def __init__(self):
         self.toolserver_url = TOOLSERVER_URL
+        self.chunker = TextChunker(
+            strategy=CHUNK_STRATEGY,
+            chunk_size=CHUNK_SIZE,
+            overlap=CHUNK_OVERLAP
+        )
+        self.session = requests.Session()
+    
+    def process_file(self, file_path: str) -> Optional[List[str]]:
+        text = self.extract_text(file_path)
+        if text is None:
+            return None
+        return self.index_file_text(file_path, text)
     
-    def process_file(self, file_path: str):
+    def extract_text(self, file_path: str) -> Optional[str]:
         path = Path(file_path)
         extension = path.suffix.lower()
         
@@ -24,50 +47,107 @@ class DocumentProcessor:
         
         try:
             if extension == '.pdf':
-                text = self._extract_pdf(file_path)
+                return self._extract_pdf(file_path)
             elif extension in ['.docx', '.doc']:
-                text = self._extract_docx(file_path)
+                return self._extract_docx(file_path)
             elif extension == '.txt':
-                text = self._extract_text(file_path)
+                return self._extract_text(file_path)
             elif extension in ['.png', '.jpg', '.jpeg', '.tiff']:
-                text = self._extract_image_ocr(file_path)
+                return self._extract_image_ocr(file_path)
             else:
                 logger.warning(f"Unsupported file type: {extension}")
-                return
-            
-            if text and len(text.strip()) > 0:
-                self.process_text(text, metadata={
-                    "source": "file",
-                    "filename": path.name,
-                    "path": str(path),
-                    "type": extension
-                })
-            else:
-                logger.warning(f"No text extracted from {path.name}")
+                return None
         
         except Exception as e:
             logger.error(f"Error processing {path.name}: {e}")
+            return None
+    
+    def index_file_text(self, file_path: str, text: str) -> Optional[List[str]]:
+        path = Path(file_path)
+        
+        if not text or len(text.strip()) == 0:
+            logger.warning(f"No text extracted from {path.name}")
+            return []
+        
+        return self.process_text(text, metadata={
+            "source": "file",
+            "filename": path.name,
+            "path": str(path),
+            "type": path.suffix.lower()
+        })
     
-    def process_text(self, text: str, metadata: Optional[Dict[str, Any]] = None):
+    def process_text(self, text: str, metadata: Optional[Dict[str, Any]] = None) -> Optional[List[str]]:
+        # Returns the chunk ids, [] if there is nothing to index, or None if
+        # the upload failed; a failed upload leaves no chunks behind.
         if not text or len(text.strip()) < 10:
             logger.warning("Text too short to index")
-            return
+            return []
+        
+        metadata = metadata or {}
+        chunks = self.chunker.chunk(text)
+        documents = [
+            {
+                "text": chunk,
+                "metadata": {**metadata, "chunk_index": index, "chunk_count": len(chunks)}
+            }
+            for index, chunk in enumerate(chunks)
+        ]
         
+        ids = []
         try:
-            response = requests.post(
-                f"{self.toolserver_url}/v1/documents",
-                json={
-                    "text": text,
-                    "metadata": metadata or {}
-                },
-                timeout=10
-            )
-            response.raise_for_status()
+            for start in range(0, len(documents), UPLOAD_BATCH_SIZE):
+                response = self.session.post(
+                    f"{self.toolserver_url}/v1/documents:batch",
+                    json={"documents": documents[start:start + UPLOAD_BATCH_SIZE]},
+                    timeout=120
+                )
+                response.raise_for_status()
+                ids.extend(response.json().get("ids", []))
             
-            logger.info(f"Document indexed successfully: {metadata.get('filename', 'unknown')}")
+            logger.info(f"Document indexed successfully: {metadata.get('filename', 'unknown')} ({len(chunks)} chunks)")
         
         except Exception as e:
             logger.error(f"Error indexing document: {e}")
+            if ids and not self.delete_documents(ids):
+                logger.error(f"Could not remove {len(ids)} chunks of the failed upload")
+            return None
+        
+        return ids
+    
+    def delete_documents(self, ids: List[str]) -> bool:
+        if not ids:
+            return True
+        
+        try:
+            response = self.session.post(
+                f"{self.toolserver_url}/v1/documents:batchDelete",
+                json={"ids": ids},
+                timeout=60
+            )
+            response.raise_for_status()
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error deleting documents: {e}")
+            return False
+    
+    def update_file_metadata(self, ids: List[str], file_path: str) -> bool:
+        if not ids:
+            return True
+        
+        path = Path(file_path)
+        try:
+            response = self.session.post(
+                f"{self.toolserver_url}/v1/documents:batchUpdateMetadata",
+                json={"ids": ids, "metadata": {"filename": path.name, "path": str(path), "type": path.suffix.lower()}},
+                timeout=60
+            )
+            response.raise_for_status()
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error updating documents: {e}")
+            return False
     
     def _extract_pdf(self, file_path: str) -> str:
         text = ""
@@ -106,3 +186,27 @@ class DocumentProcessor:
         except Exception as e:
             logger.error(f"Error performing OCR: {e}")
             return ""
+
+_worker_processor: Optional[DocumentProcessor] = None
+
+def wait_until_stable(file_path: str, interval: float = 0.5, timeout: float = 10.0):
+    # Files copied onto the NAS may still be growing when the event fires.
+    deadline = time.monotonic() + timeout
+    last_size = -1
+    while time.monotonic() < deadline:
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            return
+        if size == last_size:
+            return
+        last_size = size
+        time.sleep(interval)
+
+def extract_file_text(file_path: str) -> Optional[str]:
+    # Used from extraction worker processes.
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DocumentProcessor()
+    
+    return _worker_processor.extract_text(file_path)
@@ -1,17 +1,19 @@
 import os
 import time
 import logging
-from pathlib import Path
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from document_processor import DocumentProcessor
+from threading import Thread
+from document_processor import DocumentProcessor, is_supported_file
+from ingestion_index import IngestionIndex
+from pipeline import IngestionPipeline
+from reconciler import Reconciler
 
 logger = logging.getLogger(__name__)
 
 class DocumentHandler(FileSystemEventHandler):
-    def __init__(self, processor: DocumentProcessor):
-        self.processor = processor
-        self.processed_files = set()
+    def __init__(self, pipeline: IngestionPipeline):
+        self.pipeline = pipeline
     
     def on_created(self, event):
         if event.is_directory:
@@ -19,27 +21,64 @@ class DocumentHandler(FileSystemEventHandler):
         
         file_path = event.src_path
         
-        if file_path in self.processed_files:
+        if self._is_supported_file(file_path):
+            logger.info(f"New file detected: {file_path}")
+            try:
+                self.pipeline.submit(file_path)
+            except Exception as e:
+                logger.error(f"Error processing {file_path}: {e}")
+    
+    def on_modified(self, event):
+        if event.is_directory:
             return
         
-        time.sleep(1)
+        file_path = event.src_path
         
         if self._is_supported_file(file_path):
-            logger.info(f"New file detected: {file_path}")
             try:
-                self.processor.process_file(file_path)
-                self.processed_files.add(file_path)
+                if self.pipeline.submit(file_path):
+                    logger.info(f"Modified file detected: {file_path}")
             except Exception as e:
                 logger.error(f"Error processing {file_path}: {e}")
     
+    def on_moved(self, event):
+        try:
+            if event.is_directory:
+                for path in self.pipeline.index.paths_with_prefix(event.src_path.rstrip(os.sep) + os.sep):
+                    self.pipeline.move(path, event.dest_path + path[len(event.src_path):])
+                return
+            
+            logger.info(f"File moved: {event.src_path} -> {event.dest_path}")
+            if self._is_supported_file(event.dest_path):
+                self.pipeline.move(event.src_path, event.dest_path)
+            else:
+                self.pipeline.remove(event.src_path)
+        except Exception as e:
+            logger.error(f"Error handling move {event.src_path} -> {event.dest_path}: {e}")
+    
+    def on_deleted(self, event):
+        try:
+            if event.is_directory:
+                for path in self.pipeline.index.paths_with_prefix(event.src_path.rstrip(os.sep) + os.sep):
+                    self.pipeline.remove(path)
+                return
+            
+            if self._is_supported_file(event.src_path):
+                logger.info(f"File deleted: {event.src_path}")
+                self.pipeline.remove(event.src_path)
+        except Exception as e:
+            logger.error(f"Error handling deletion of {event.src_path}: {e}")
+    
     def _is_supported_file(self, file_path: str) -> bool:
-        supported_extensions = {'.pdf', '.docx', '.doc', '.txt', '.png', '.jpg', '.jpeg', '.tiff'}
-        return Path(file_path).suffix.lower() in supported_extensions
+        return is_supported_file(file_path)
 
 class FileWatcher:
     def __init__(self, watch_path: str):
         self.watch_path = watch_path
         self.processor = DocumentProcessor()
+        self.index = None
+        self.pipeline = None
+        self.reconciler = None
         self.observer = None
     
     def start(self):
@@ -48,13 +87,20 @@ class FileWatcher:
             logger.info(f"Creating directory: {self.watch_path}")
             os.makedirs(self.watch_path, exist_ok=True)
         
-        event_handler = DocumentHandler(self.processor)
+        self.index = IngestionIndex()
+        self.pipeline = IngestionPipeline(self.processor, self.index)
+        self.pipeline.start()
+        event_handler = DocumentHandler(self.pipeline)
+        
         self.observer = Observer()
         self.observer.schedule(event_handler, self.watch_path, recursive=True)
         self.observer.start()
         
         logger.info(f"Watching directory: {self.watch_path}")
         
+        self.reconciler = Reconciler(self.watch_path, self.index, self.pipeline)
+        Thread(target=self.reconciler.run, daemon=True).start()
+        
         try:
             while True:
                 time.sleep(10)
@@ -62,7 +108,16 @@ class FileWatcher:
             self.stop()
     
     def stop(self):
+        if self.reconciler:
+            self.reconciler.stop()
+        
         if self.observer:
             self.observer.stop()
             self.observer.join()
             logger.info("File watcher stopped")
+        
+        if self.pipeline:
+            self.pipeline.stop()
+        
+        if self.index:
+            self.index.close()
@@ -0,0 +1,183 @@
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+from datetime import datetime
+from threading import Lock
+from typing import Dict, Any, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+INGESTION_INDEX_PATH = os.getenv("INGESTION_INDEX_PATH", "/app/data/ingestion_index.db")
+
+def hash_file(file_path: str, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class IngestionIndex:
+    def __init__(self, db_path: str = INGESTION_INDEX_PATH):
+        self.db_path = db_path
+        self.lock = Lock()
+        
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self.connection = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS indexed_files (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    chroma_ids TEXT NOT NULL,
+                    indexed_at TEXT NOT NULL
+                )
+                """
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_indexed_files_hash ON indexed_files (content_hash)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS scan_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS scanned_dirs (
+                    scan_id TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    PRIMARY KEY (scan_id, path)
+                )
+                """
+            )
+    
+    def _to_dict(self, row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        entry = dict(row)
+        entry["chroma_ids"] = json.loads(entry["chroma_ids"])
+        return entry
+    
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT * FROM indexed_files WHERE path = ?", (path,)
+            ).fetchone()
+        return self._to_dict(row)
+    
+    def find_by_hash(self, content_hash: str) -> List[Dict[str, Any]]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT * FROM indexed_files WHERE content_hash = ?", (content_hash,)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+    
+    def is_unchanged(self, path: str, size: int, mtime: float) -> bool:
+        entry = self.get(path)
+        return entry is not None and entry["size"] == size and entry["mtime"] == mtime
+    
+    def upsert(self, path: str, size: int, mtime: float, content_hash: str, chroma_ids: List[str]):
+        with self.lock, self.connection:
+            self.connection.execute(
+                """
+                INSERT INTO indexed_files (path, size, mtime, content_hash, chroma_ids, indexed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    size = excluded.size,
+                    mtime = excluded.mtime,
+                    content_hash = excluded.content_hash,
+                    chroma_ids = excluded.chroma_ids,
+                    indexed_at = excluded.indexed_at
+                """,
+                (path, size, mtime, content_hash, json.dumps(chroma_ids), datetime.utcnow().isoformat())
+            )
+    
+    def touch(self, path: str, size: int, mtime: float):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE indexed_files SET size = ?, mtime = ? WHERE path = ?",
+                (size, mtime, path)
+            )
+    
+    def rename(self, old_path: str, new_path: str, size: int, mtime: float) -> bool:
+        with self.lock, self.connection:
+            exists = self.connection.execute(
+                "SELECT 1 FROM indexed_files WHERE path = ?", (old_path,)
+            ).fetchone()
+            if exists is None:
+                return False
+            self.connection.execute("DELETE FROM indexed_files WHERE path = ?", (new_path,))
+            self.connection.execute(
+                "UPDATE indexed_files SET path = ?, size = ?, mtime = ? WHERE path = ?",
+                (new_path, size, mtime, old_path)
+            )
+        return True
+    
+    def remove(self, path: str) -> List[str]:
+        entry = self.get(path)
+        if entry is None:
+            return []
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM indexed_files WHERE path = ?", (path,))
+        return entry["chroma_ids"]
+    
+    def all_paths(self) -> List[str]:
+        with self.lock:
+            rows = self.connection.execute("SELECT path FROM indexed_files").fetchall()
+        return [row["path"] for row in rows]
+    
+    def paths_with_prefix(self, prefix: str) -> List[str]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT path FROM indexed_files WHERE substr(path, 1, ?) = ?",
+                (len(prefix), prefix)
+            ).fetchall()
+        return [row["path"] for row in rows]
+    
+    def get_state(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM scan_state WHERE key = ?", (key,)
+            ).fetchone()
+        return row["value"] if row else None
+    
+    def set_state(self, key: str, value: Optional[str]):
+        with self.lock, self.connection:
+            if value is None:
+                self.connection.execute("DELETE FROM scan_state WHERE key = ?", (key,))
+            else:
+                self.connection.execute(
+                    "INSERT INTO scan_state (key, value) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    (key, value)
+                )
+    
+    def mark_dir_scanned(self, scan_id: str, path: str):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO scanned_dirs (scan_id, path) VALUES (?, ?)",
+                (scan_id, path)
+            )
+    
+    def get_scanned_dirs(self, scan_id: str) -> Set[str]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT path FROM scanned_dirs WHERE scan_id = ?", (scan_id,)
+            ).fetchall()
+        return {row["path"] for row in rows}
+    
+    def clear_scan(self, scan_id: str):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM scanned_dirs WHERE scan_id = ?", (scan_id,))
+    
+    def close(self):
+        with self.lock:
+            self.connection.close()
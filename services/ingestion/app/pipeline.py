@@ -0,0 +1,241 @@
+import os
+import queue
+import logging
+from threading import Thread, BoundedSemaphore, Lock
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Callable, Dict, Any, List, Optional
+from document_processor import DocumentProcessor, extract_file_text, wait_until_stable
+from ingestion_index import IngestionIndex, hash_file
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+INGESTION_QUEUE_SIZE = int(os.getenv("INGESTION_QUEUE_SIZE", str(EXTRACTION_WORKERS * 4)))
+
+_worker_index: Optional[IngestionIndex] = None
+
+def prepare_file(file_path: str) -> Dict[str, Any]:
+    # Runs in an extraction worker: hashes the file and only extracts text
+    # when the content is not already indexed under this or another path.
+    global _worker_index
+    if _worker_index is None:
+        _worker_index = IngestionIndex()
+    
+    wait_until_stable(file_path)
+    stat = os.stat(file_path)
+    content_hash = hash_file(file_path)
+    result = {"size": stat.st_size, "mtime": stat.st_mtime, "content_hash": content_hash}
+    
+    entry = _worker_index.get(file_path)
+    if entry and entry["content_hash"] == content_hash:
+        return {**result, "status": "unchanged"}
+    
+    for other in _worker_index.find_by_hash(content_hash):
+        if other["path"] == file_path or not other["chroma_ids"]:
+            continue
+        if os.path.exists(other["path"]):
+            return {**result, "status": "duplicate", "original": other["path"]}
+        return {**result, "status": "moved", "original": other["path"]}
+    
+    return {**result, "status": "extracted", "text": extract_file_text(file_path)}
+
+class IngestionPipeline:
+    def __init__(
+        self,
+        processor: DocumentProcessor,
+        index: IngestionIndex,
+        extraction_workers: int = EXTRACTION_WORKERS,
+        upload_workers: int = UPLOAD_WORKERS,
+        queue_size: int = INGESTION_QUEUE_SIZE
+    ):
+        self.processor = processor
+        self.index = index
+        self.extraction_workers = extraction_workers
+        self.upload_workers = upload_workers
+        
+        # Bounds files that are being extracted or waiting for upload, so a
+        # burst of events blocks the submitter instead of growing memory.
+        self.slots = BoundedSemaphore(queue_size)
+        self.upload_queue: "queue.Queue[Optional[tuple[str, Future]]]" = queue.Queue()
+        self.pending: Dict[str, List[Callable[[], None]]] = {}
+        self.pending_lock = Lock()
+        
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.upload_threads: List[Thread] = []
+    
+    def start(self):
+        self.pool = ProcessPoolExecutor(max_workers=self.extraction_workers)
+        for index in range(self.upload_workers):
+            thread = Thread(target=self._upload_loop, name=f"ingestion-upload-{index}", daemon=True)
+            thread.start()
+            self.upload_threads.append(thread)
+        
+        logger.info(
+            f"Ingestion pipeline started ({self.extraction_workers} extraction workers, "
+            f"{self.upload_workers} upload workers)"
+        )
+    
+    def submit(self, file_path: str, on_done: Optional[Callable[[], None]] = None) -> bool:
+        # on_done is called exactly once, after the file has been handled or
+        # right away if there is nothing to do.
+        try:
+            stat = os.stat(file_path)
+            unchanged = self.index.is_unchanged(file_path, stat.st_size, stat.st_mtime)
+        except OSError:
+            unchanged = True
+        if unchanged:
+            if on_done:
+                on_done()
+            return False
+        
+        with self.pending_lock:
+            if file_path in self.pending:
+                if on_done:
+                    self.pending[file_path].append(on_done)
+                return False
+            self.pending[file_path] = [on_done] if on_done else []
+        
+        self.slots.acquire()
+        try:
+            future = self.pool.submit(prepare_file, file_path)
+        except Exception:
+            self._finish(file_path)
+            raise
+        
+        future.add_done_callback(lambda f: self.upload_queue.put((file_path, f)))
+        return True
+    
+    def _upload_loop(self):
+        while True:
+            item = self.upload_queue.get()
+            if item is None:
+                break
+            
+            file_path, future = item
+            try:
+                self._handle_result(file_path, future.result())
+            except Exception as e:
+                logger.error(f"Error processing {file_path}: {e}")
+            finally:
+                self._finish(file_path)
+    
+    def _handle_result(self, file_path: str, result: Dict[str, Any]):
+        status = result["status"]
+        size, mtime, content_hash = result["size"], result["mtime"], result["content_hash"]
+        
+        if status == "unchanged":
+            self.index.touch(file_path, size, mtime)
+            return
+        
+        previous = self.index.get(file_path)
+        stale_original = None
+        
+        if status == "duplicate":
+            logger.info(f"Skipping {file_path}: same content as {result['original']}")
+            self.index.upsert(file_path, size, mtime, content_hash, [])
+        elif status == "moved":
+            original = self.index.get(result["original"])
+            if original is not None and not self.processor.update_file_metadata(original["chroma_ids"], file_path):
+                # The chunks still carry the old path, so the file is indexed
+                # again and the original's chunks are dropped afterwards.
+                logger.info(f"Could not move chunks of {result['original']} to {file_path}, extracting")
+                stale_original = result["original"]
+                status = "extracted"
+            elif original is not None and self.index.rename(result["original"], file_path, size, mtime):
+                logger.info(f"Detected move {result['original']} -> {file_path}")
+            else:
+                # The original was removed in the meantime, taking its chunks
+                # with it; this rare case is extracted in the upload worker.
+                logger.info(f"Original {result['original']} of {file_path} is gone, extracting")
+                status = "extracted"
+            
+            if status == "extracted":
+                result = {**result, "text": extract_file_text(file_path)}
+        
+        if status == "extracted":
+            text = result.get("text")
+            if text is None:
+                return
+            
+            ids = self.processor.index_file_text(file_path, text)
+            if ids is None:
+                # Not recorded, so the file is retried on the next event or scan.
+                return
+            self.index.upsert(file_path, size, mtime, content_hash, ids)
+        
+        if stale_original and not os.path.exists(stale_original):
+            self.remove(stale_original)
+        
+        if previous and previous["chroma_ids"]:
+            self.processor.delete_documents(previous["chroma_ids"])
+            if previous["content_hash"] != content_hash:
+                self._reindex_copy(previous["content_hash"])
+    
+    def remove(self, file_path: str):
+        entry = self.index.get(file_path)
+        ids = self.index.remove(file_path)
+        if ids:
+            logger.info(f"Removing {len(ids)} chunks of deleted file: {file_path}")
+            self.processor.delete_documents(ids)
+            self._reindex_copy(entry["content_hash"])
+    
+    def _reindex_copy(self, content_hash: str):
+        # Copies of a file are stored without chunks. When the file holding
+        # the chunks goes away or changes, one remaining copy takes over.
+        for copy in self.index.find_by_hash(content_hash):
+            if copy["chroma_ids"]:
+                return
+        
+        for copy in self.index.find_by_hash(content_hash):
+            if os.path.exists(copy["path"]):
+                logger.info(f"Re-indexing copy {copy['path']}")
+                self.index.remove(copy["path"])
+                # Submitting may block on a free slot, which upload workers
+                # must not wait for.
+                Thread(target=self.submit, args=(copy["path"],), daemon=True).start()
+                return
+    
+    def move(self, src_path: str, dest_path: str):
+        source = self.index.get(src_path)
+        if source is None:
+            self.submit(dest_path)
+            return
+        
+        try:
+            stat = os.stat(dest_path)
+        except OSError:
+            self.remove(src_path)
+            return
+        
+        # The chunks are updated first; if that fails the index still points
+        # at src_path, and the resubmitted file is detected as a move again.
+        previous = self.index.get(dest_path)
+        if (not self.processor.update_file_metadata(source["chroma_ids"], dest_path)
+                or not self.index.rename(src_path, dest_path, stat.st_size, stat.st_mtime)):
+            self.submit(dest_path)
+            return
+        if previous and previous["chroma_ids"]:
+            self.processor.delete_documents(previous["chroma_ids"])
+    
+    def _finish(self, file_path: str):
+        with self.pending_lock:
+            callbacks = self.pending.pop(file_path, [])
+        self.slots.release()
+        
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error in completion callback for {file_path}: {e}")
+    
+    def stop(self):
+        if self.pool:
+            self.pool.shutdown(wait=True)
+        
+        for _ in self.upload_threads:
+            self.upload_queue.put(None)
+        for thread in self.upload_threads:
+            thread.join()
+        
+        logger.info("Ingestion pipeline stopped")
@@ -0,0 +1,187 @@
+import os
+import time
+import uuid
+import queue
+import logging
+from threading import Thread, Lock, Event, Condition
+from typing import Optional, Set
+from document_processor import is_supported_file
+from ingestion_index import IngestionIndex
+from pipeline import IngestionPipeline
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_SCAN_WORKERS = int(os.getenv("RECONCILE_SCAN_WORKERS", "4"))
+RECONCILE_MAX_FILES_PER_SECOND = float(os.getenv("RECONCILE_MAX_FILES_PER_SECOND", "20"))
+
+CURRENT_SCAN_KEY = "current_scan_id"
+
+class RateLimiter:
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_allowed = time.monotonic()
+        self.lock = Lock()
+    
+    def wait(self):
+        if self.interval <= 0:
+            return
+        
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_allowed - now
+            self.next_allowed = max(now, self.next_allowed) + self.interval
+        
+        if delay > 0:
+            time.sleep(delay)
+
+class Reconciler:
+    def __init__(
+        self,
+        root_path: str,
+        index: IngestionIndex,
+        pipeline: IngestionPipeline,
+        scan_workers: int = RECONCILE_SCAN_WORKERS,
+        max_files_per_second: float = RECONCILE_MAX_FILES_PER_SECOND
+    ):
+        self.root_path = root_path
+        self.index = index
+        self.pipeline = pipeline
+        self.scan_workers = scan_workers
+        self.rate_limiter = RateLimiter(max_files_per_second)
+        self.stopped = Event()
+        
+        self.outstanding = 0
+        self.outstanding_changed = Condition()
+    
+    def run(self):
+        # Directories finished by an interrupted scan are recorded under its
+        # scan id, so a restart continues instead of starting over.
+        scan_id = self.index.get_state(CURRENT_SCAN_KEY)
+        if scan_id:
+            completed = self.index.get_scanned_dirs(scan_id)
+            logger.info(f"Resuming reconciliation scan ({len(completed)} directories already done)")
+        else:
+            scan_id = uuid.uuid4().hex
+            completed = set()
+            self.index.set_state(CURRENT_SCAN_KEY, scan_id)
+            logger.info(f"Starting reconciliation scan of {self.root_path}")
+        
+        start = time.monotonic()
+        submitted = self._walk(scan_id, completed)
+        
+        # Moves detected by content hash rename the original's row, so it may
+        # only be treated as deleted once every queued file is handled.
+        self._wait_for_files()
+        if self.stopped.is_set():
+            logger.info("Reconciliation scan interrupted, will resume on next start")
+            return
+        
+        removed = self._remove_missing()
+        
+        self.index.set_state(CURRENT_SCAN_KEY, None)
+        self.index.clear_scan(scan_id)
+        logger.info(
+            f"Reconciliation finished in {time.monotonic() - start:.1f}s: "
+            f"{submitted} files queued, {removed} deleted files removed"
+        )
+    
+    def stop(self):
+        self.stopped.set()
+    
+    def _file_done(self):
+        with self.outstanding_changed:
+            self.outstanding -= 1
+            self.outstanding_changed.notify_all()
+    
+    def _wait_for_files(self):
+        with self.outstanding_changed:
+            while self.outstanding and not self.stopped.is_set():
+                self.outstanding_changed.wait(timeout=1.0)
+    
+    def _walk(self, scan_id: str, completed: Set[str]) -> int:
+        directories: "queue.Queue[Optional[str]]" = queue.Queue()
+        directories.put(self.root_path)
+        counter = {"submitted": 0}
+        counter_lock = Lock()
+        
+        def worker():
+            while True:
+                directory = directories.get()
+                try:
+                    if directory is None:
+                        return
+                    if not self.stopped.is_set():
+                        count = self._scan_directory(scan_id, directory, directories, skip_files=directory in completed)
+                        with counter_lock:
+                            counter["submitted"] += count
+                except Exception as e:
+                    logger.error(f"Error scanning {directory}: {e}")
+                finally:
+                    directories.task_done()
+        
+        threads = [Thread(target=worker, daemon=True) for _ in range(self.scan_workers)]
+        for thread in threads:
+            thread.start()
+        
+        directories.join()
+        for _ in threads:
+            directories.put(None)
+        for thread in threads:
+            thread.join()
+        
+        return counter["submitted"]
+    
+    def _scan_directory(
+        self,
+        scan_id: str,
+        directory: str,
+        directories: "queue.Queue[Optional[str]]",
+        skip_files: bool
+    ) -> int:
+        # A directory counts as done once its listing is complete and the
+        # pipeline has handled all of its files, so a restart never skips
+        # files that were only queued.
+        remaining = {"count": 1}
+        remaining_lock = Lock()
+        
+        def release():
+            with remaining_lock:
+                remaining["count"] -= 1
+                finished = remaining["count"] == 0
+            if finished:
+                self.index.mark_dir_scanned(scan_id, directory)
+        
+        def file_done():
+            release()
+            self._file_done()
+        
+        submitted = 0
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if self.stopped.is_set():
+                    break
+                
+                if entry.is_dir(follow_symlinks=False):
+                    directories.put(entry.path)
+                elif not skip_files and entry.is_file() and is_supported_file(entry.path):
+                    with self.outstanding_changed:
+                        self.outstanding += 1
+                    with remaining_lock:
+                        remaining["count"] += 1
+                    if self.pipeline.submit(entry.path, on_done=file_done):
+                        submitted += 1
+                        self.rate_limiter.wait()
+        
+        if not self.stopped.is_set():
+            release()
+        return submitted
+    
+    def _remove_missing(self) -> int:
+        removed = 0
+        for path in self.index.all_paths():
+            if self.stopped.is_set():
+                break
+            if not os.path.exists(path):
+                self.pipeline.remove(path)
+                removed += 1
+        return removed
@@ -0,0 +1,61 @@
+import re
+import unicodedata
+from typing import Dict, List, Set, Tuple
+
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+MIN_TOKEN_LENGTH = 3
+VALUE_MATCH_WEIGHT = 0.25
+
+def tokenize(text: str) -> List[str]:
+    # Fact keys are written without umlauts (versicherung.gebaeude.summe),
+    # so both keys and queries are folded the same way before matching.
+    folded = unicodedata.normalize("NFC", text).casefold().translate(UMLAUTS)
+    return [token for token in re.split(r"[^0-9a-z]+", folded) if len(token) >= MIN_TOKEN_LENGTH]
+
+def tokenize_value(value: str) -> Set[str]:
+    return {token for token in tokenize(value) if len(token) >= 4}
+
+def token_matches(fact_token: str, query_tokens: Set[str]) -> bool:
+    if fact_token in query_tokens:
+        return True
+    # German compounds: "gebaeudeversicherung" should match the key parts
+    # "gebaeude" and "versicherung", and "steuer" the key part "steuerfrist".
+    if len(fact_token) < 4:
+        return False
+    return any(
+        fact_token in query_token or (len(query_token) >= 4 and query_token in fact_token)
+        for query_token in query_tokens
+    )
+
+class FactIndex:
+    # Token index over fact keys and values, used to guess which facts a
+    # query refers to before the LLM is asked.
+    def __init__(self):
+        self.key_tokens: Dict[str, List[str]] = {}
+        self.value_tokens: Dict[str, Set[str]] = {}
+    
+    def replace(self, facts: Dict[str, str]):
+        key_tokens = {key: tokenize(key) for key in facts}
+        value_tokens = {key: tokenize_value(value) for key, value in facts.items()}
+        self.key_tokens, self.value_tokens = key_tokens, value_tokens
+    
+    def update(self, key: str, value: str):
+        self.key_tokens[key] = tokenize(key)
+        self.value_tokens[key] = tokenize_value(value)
+    
+    def match(self, query: str, limit: int, min_score: float) -> List[Tuple[str, float]]:
+        query_tokens = set(tokenize(query))
+        if not query_tokens:
+            return []
+        
+        scored = []
+        for key, tokens in self.key_tokens.items():
+            if not tokens:
+                continue
+            score = sum(1 for token in tokens if token_matches(token, query_tokens)) / len(tokens)
+            score += VALUE_MATCH_WEIGHT * len(self.value_tokens.get(key, set()) & query_tokens)
+            if score >= min_score:
+                scored.append((key, score))
+        
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
@@ -1,16 +1,66 @@
 import os
-import requests
-import json
 import re
-from typing import Dict, List, Optional, Any
+import time
+import asyncio
+import httpx
+import json
+from typing import Dict, List, Optional, Any, AsyncIterator
+from response_cache import ResponseCache, context_hash, normalize_query
+from fact_index import FactIndex
+from sessions import Session, SessionStore, fit_to_budget
 
 TOOLSERVER_URL = os.getenv("TOOLSERVER_URL", "http://toolserver:8002")
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://llama:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1")
 
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+TOOLS_CACHE_TTL = float(os.getenv("TOOLS_CACHE_TTL", "60"))
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "15"))
+MAX_TOOL_ROUNDS = int(os.getenv("MAX_TOOL_ROUNDS", "5"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "500"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_EMBED_MODEL = os.getenv("RESPONSE_CACHE_EMBED_MODEL", "")
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95"))
+PREROUTE_ENABLED = os.getenv("PREROUTE_ENABLED", "true").lower() == "true"
+PREROUTE_MAX_FACTS = int(os.getenv("PREROUTE_MAX_FACTS", "5"))
+PREROUTE_MIN_SCORE = float(os.getenv("PREROUTE_MIN_SCORE", "0.5"))
+PREROUTE_DOCUMENTS = int(os.getenv("PREROUTE_DOCUMENTS", "3"))
+PREROUTE_DOC_MAX_DISTANCE = float(os.getenv("PREROUTE_DOC_MAX_DISTANCE", "1.0"))
+PREROUTE_TIMEOUT = float(os.getenv("PREROUTE_TIMEOUT", "3"))
+FACT_INDEX_TTL = float(os.getenv("FACT_INDEX_TTL", "30"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_RECENT_TOKEN_BUDGET = int(os.getenv("CONTEXT_RECENT_TOKEN_BUDGET", "2000"))
+TOOL_RESULT_MAX_CHARS = int(os.getenv("TOOL_RESULT_MAX_CHARS", "2000"))
+SEARCH_RESULT_MAX_CHARS = int(os.getenv("SEARCH_RESULT_MAX_CHARS", "500"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "86400"))
+
 SYSTEM_PROMPT_PATH = "/app/config/system_prompt.txt"
 PERSONA_PROMPT_PATH = "/app/config/persona_prompt.txt"
 
+LLM_ERROR_PREFIX = "Fehler bei der LLM-Anfrage"
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=10
+        )
+    return _http_client
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 def load_prompts() -> tuple[str, str]:
     with open(SYSTEM_PROMPT_PATH, "r", encoding="utf-8") as f:
         system_prompt = f.read()
@@ -20,189 +70,797 @@ def load_prompts() -> tuple[str, str]:
     
     return system_prompt, persona_prompt
 
-def get_available_tools() -> List[Dict[str, Any]]:
-    try:
-        response = requests.get(f"{TOOLSERVER_URL}/v1/tools", timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        return data.get("tools", [])
-    except Exception as e:
-        print(f"Error fetching tools: {e}")
-        return []
+def get_prompt_mtimes() -> tuple[int, int]:
+    return (
+        os.stat(SYSTEM_PROMPT_PATH).st_mtime_ns,
+        os.stat(PERSONA_PROMPT_PATH).st_mtime_ns
+    )
 
-def call_ollama(messages: List[Dict[str, str]]) -> str:
-    try:
-        payload = {
-            "model": OLLAMA_MODEL,
-            "messages": messages,
-            "stream": False
-        }
+def build_system_prompt(system_prompt: str, persona_prompt: str, tools: List[Dict[str, Any]]) -> str:
+    tools_description = "\n".join([
+        f"- {tool['name']}: {tool['description']}"
+        for tool in tools
+    ])
+    
+    return f"{system_prompt}\n\n{persona_prompt}\n\nVerfügbare Tools:\n{tools_description}"
+
+class SystemPromptCache:
+    def __init__(self, tools_ttl: float = TOOLS_CACHE_TTL):
+        self.tools_ttl = tools_ttl
+        self._prompt_mtimes: Optional[tuple[int, int]] = None
+        self._prompts: tuple[str, str] = ("", "")
+        self._tools: Optional[List[Dict[str, Any]]] = None
+        self._tools_etag: Optional[str] = None
+        self._tools_checked_at = 0.0
+        self._tools_version = 0
+        self._tools_lock = asyncio.Lock()
+        self._built_for: Optional[tuple] = None
+        self._system_prompt = ""
+    
+    def _refresh_prompts(self) -> None:
+        mtimes = get_prompt_mtimes()
+        if mtimes != self._prompt_mtimes:
+            self._prompts = load_prompts()
+            self._prompt_mtimes = mtimes
+    
+    async def _refresh_tools(self) -> None:
+        if self._tools is not None and time.monotonic() - self._tools_checked_at < self.tools_ttl:
+            return
+        
+        async with self._tools_lock:
+            if self._tools is not None and time.monotonic() - self._tools_checked_at < self.tools_ttl:
+                return
+            
+            headers = {}
+            if self._tools is not None and self._tools_etag:
+                headers["If-None-Match"] = self._tools_etag
+            
+            try:
+                response = await get_http_client().get(
+                    f"{TOOLSERVER_URL}/v1/tools",
+                    headers=headers,
+                    timeout=5
+                )
+                if response.status_code != 304:
+                    response.raise_for_status()
+                    data = response.json()
+                    self._tools = data.get("tools", [])
+                    self._tools_etag = response.headers.get("ETag")
+                    self._tools_version += 1
+                self._tools_checked_at = time.monotonic()
+            except Exception as e:
+                print(f"Error fetching tools: {e}")
+    
+    async def get_tools(self) -> List[Dict[str, Any]]:
+        await self._refresh_tools()
+        return self._tools or []
+    
+    async def get_system_prompt(self) -> str:
+        self._refresh_prompts()
+        await self._refresh_tools()
+        
+        built_for = (self._prompt_mtimes, self._tools_version)
+        if built_for != self._built_for:
+            system_prompt, persona_prompt = self._prompts
+            self._system_prompt = build_system_prompt(system_prompt, persona_prompt, self._tools or [])
+            self._built_for = built_for
+        
+        return self._system_prompt
+
+prompt_cache = SystemPromptCache()
+
+async def get_available_tools() -> List[Dict[str, Any]]:
+    return await prompt_cache.get_tools()
+
+class FactIndexCache:
+    def __init__(self, ttl: float = FACT_INDEX_TTL):
+        self.ttl = ttl
+        self.index = FactIndex()
+        self._etag: Optional[str] = None
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+    
+    async def get_index(self) -> FactIndex:
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return self.index
+        
+        async with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self.index
+            
+            headers = {"If-None-Match": self._etag} if self._etag else {}
+            try:
+                response = await get_http_client().get(
+                    f"{TOOLSERVER_URL}/v1/facts",
+                    params={"fields": "key,value"},
+                    headers=headers,
+                    timeout=5
+                )
+                if response.status_code != 304:
+                    response.raise_for_status()
+                    self.index.replace({fact["key"]: fact["value"] for fact in response.json()})
+                    self._etag = response.headers.get("ETag")
+            except Exception as e:
+                print(f"Error loading fact index: {e}")
+            self._loaded_at = time.monotonic()
         
-        response = requests.post(
+        return self.index
+
+fact_index_cache = FactIndexCache()
+
+session_store = SessionStore(
+    max_sessions=SESSION_MAX,
+    ttl=SESSION_TTL,
+    token_budget=CONTEXT_TOKEN_BUDGET,
+    recent_budget=CONTEXT_RECENT_TOKEN_BUDGET
+)
+
+_background_tasks: set = set()
+
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_SIZE,
+    ttl=RESPONSE_CACHE_TTL,
+    similarity_threshold=RESPONSE_CACHE_SIMILARITY
+)
+
+def to_ollama_tools(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": tool["name"],
+                "description": tool.get("description", ""),
+                "parameters": tool.get("parameters", {"type": "object", "properties": {}})
+            }
+        }
+        for tool in tools
+    ]
+
+def build_ollama_payload(
+    messages: List[Dict[str, Any]],
+    tools: Optional[List[Dict[str, Any]]],
+    stream: bool
+) -> Dict[str, Any]:
+    payload = {
+        "model": OLLAMA_MODEL,
+        "messages": messages,
+        "stream": stream
+    }
+    if tools:
+        payload["tools"] = to_ollama_tools(tools)
+    return payload
+
+async def call_ollama(
+    messages: List[Dict[str, Any]],
+    tools: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    try:
+        response = await get_http_client().post(
             f"{OLLAMA_URL}/api/chat",
-            json=payload,
+            json=build_ollama_payload(messages, tools, stream=False),
             timeout=60
         )
         response.raise_for_status()
         
         result = response.json()
-        return result.get("message", {}).get("content", "")
+        message = result.get("message", {})
+        return {
+            "role": "assistant",
+            "content": message.get("content", ""),
+            "tool_calls": parse_tool_calls(message),
+            "error": None
+        }
     
     except Exception as e:
         print(f"Error calling Ollama: {e}")
-        return f"Fehler bei der LLM-Anfrage: {str(e)}"
+        error = f"{LLM_ERROR_PREFIX}: {str(e)}"
+        return {"role": "assistant", "content": error, "tool_calls": [], "error": error}
 
-def parse_tool_calls(text: str) -> List[Dict[str, Any]]:
-    tool_call_pattern = r'<tool_call>(.*?)</tool_call>'
-    matches = re.findall(tool_call_pattern, text, re.DOTALL)
+async def call_ollama_stream(
+    messages: List[Dict[str, Any]],
+    tools: Optional[List[Dict[str, Any]]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    # Yields {"content": ...} for text chunks, {"tool_calls": [...]} once
+    # the model has decided to call tools and {"error": ...} if the request
+    # fails, possibly after some content was already streamed.
+    try:
+        async with get_http_client().stream(
+            "POST",
+            f"{OLLAMA_URL}/api/chat",
+            json=build_ollama_payload(messages, tools, stream=True),
+            timeout=60
+        ) as response:
+            response.raise_for_status()
+            
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                
+                chunk = json.loads(line)
+                message = chunk.get("message", {})
+                if message.get("content"):
+                    yield {"content": message["content"]}
+                
+                tool_calls = parse_tool_calls(message)
+                if tool_calls:
+                    yield {"tool_calls": tool_calls}
+                
+                if chunk.get("done"):
+                    break
     
+    except Exception as e:
+        print(f"Error streaming from Ollama: {e}")
+        yield {"error": f"{LLM_ERROR_PREFIX}: {str(e)}"}
+
+def parse_tool_calls(message: Dict[str, Any]) -> List[Dict[str, Any]]:
     tool_calls = []
-    for match in matches:
-        match = match.strip()
-        
-        if match.startswith("get_fact("):
-            key_match = re.search(r'get_fact\(["\'](.+?)["\']\)', match)
-            if key_match:
-                tool_calls.append({
-                    "function": "get_fact",
-                    "key": key_match.group(1)
-                })
-        
-        elif match.startswith("set_fact("):
-            params_match = re.search(r'set_fact\(["\'](.+?)["\']\s*,\s*["\'](.+?)["\']\)', match)
-            if params_match:
-                tool_calls.append({
-                    "function": "set_fact",
-                    "key": params_match.group(1),
-                    "value": params_match.group(2)
-                })
-        
-        elif match.startswith("search_docs("):
-            query_match = re.search(r'search_docs\(["\'](.+?)["\']\)', match)
-            if query_match:
-                tool_calls.append({
-                    "function": "search_docs",
-                    "query": query_match.group(1)
-                })
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function", {})
+        arguments = function.get("arguments") or {}
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments)
+            except json.JSONDecodeError:
+                arguments = {}
+        
+        if function.get("name"):
+            tool_calls.append({"function": function["name"], "arguments": arguments})
     
     return tool_calls
 
-def execute_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any]:
+def format_search_results(results: List[Dict[str, Any]], max_chars: int = SEARCH_RESULT_MAX_CHARS) -> str:
+    lines = []
+    for result in results:
+        text = result.get("text", "")
+        if len(text) > max_chars:
+            text = text[:max_chars] + "..."
+        if result.get("distance") is not None:
+            text += f" (Relevanz: {1 - result['distance']:.2f})"
+        lines.append(f"- {text}")
+    return "\n".join(lines)
+
+async def execute_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any]:
     function = tool_call.get("function")
+    arguments = tool_call.get("arguments", {})
     
     try:
-        if function == "get_fact":
-            key = tool_call.get("key")
-            response = requests.get(f"{TOOLSERVER_URL}/v1/facts/{key}", timeout=5)
-            
-            if response.status_code == 404:
-                return {"success": False, "error": "Fakt nicht gefunden"}
-            
-            response.raise_for_status()
-            data = response.json()
-            return {"success": True, "result": data.get("value")}
-        
-        elif function == "set_fact":
-            key = tool_call.get("key")
-            value = tool_call.get("value")
-            response = requests.put(
-                f"{TOOLSERVER_URL}/v1/facts/{key}",
-                json={"value": value},
-                timeout=5
-            )
-            response.raise_for_status()
-            return {"success": True, "result": "Fakt gespeichert"}
-        
-        elif function == "search_docs":
-            query = tool_call.get("query")
-            response = requests.post(
-                f"{TOOLSERVER_URL}/v1/search",
-                json={"query": query, "n_results": 3},
-                timeout=10
-            )
-            response.raise_for_status()
-            data = response.json()
-            results = data.get("results", [])
-            
-            if results:
-                formatted_results = []
-                for result in results:
-                    doc = result.get("text", "")
-                    metadata = result.get("metadata", {})
-                    distance = result.get("distance", 0)
-                    formatted_results.append(f"- {doc[:200]}... (Relevanz: {1-distance:.2f})")
-                
-                return {
-                    "success": True,
-                    "result": "\n".join(formatted_results)
-                }
-            else:
-                return {"success": True, "result": "Keine Dokumente gefunden"}
+        response = await get_http_client().post(
+            f"{TOOLSERVER_URL}/v1/tools/{function}:invoke",
+            json={"arguments": arguments},
+            timeout=10
+        )
         
-        else:
+        if response.status_code == 404:
             return {"success": False, "error": f"Unbekannte Funktion: {function}"}
+        
+        response.raise_for_status()
+        result = response.json()
+        
+        if function == "set_fact" and result.get("success"):
+            response_cache.invalidate_fact(arguments.get("key"))
+            fact_index_cache.index.update(arguments.get("key"), str(arguments.get("value")))
+        
+        return result
     
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-def process_query(
-    query: str,
-    conversation_history: Optional[List[Dict[str, str]]] = None
-) -> Dict[str, Any]:
-    system_prompt, persona_prompt = load_prompts()
-    tools = get_available_tools()
+async def prefetch_facts_for_query(query: str) -> Dict[str, str]:
+    index = await fact_index_cache.get_index()
+    keys = [key for key, _ in index.match(query, PREROUTE_MAX_FACTS, PREROUTE_MIN_SCORE)]
+    if not keys:
+        return {}
+    # The index only routes; values are read fresh so a stale index never
+    # puts an outdated value into the prompt.
+    return await batch_get_facts(keys)
+
+IDENTIFIER_PATTERN = re.compile(r"\b(?=[\w./-]*\d)\w+(?:[-/.]\w+)+\b|\b\d{5,}\b")
+
+async def prefetch_documents_for_query(query: str) -> List[Dict[str, Any]]:
+    if PREROUTE_DOCUMENTS <= 0:
+        return []
     
-    tools_description = "\n".join([
-        f"- {tool['name']}: {tool['description']}"
-        for tool in tools
-    ])
+    response = await get_http_client().post(
+        f"{TOOLSERVER_URL}/v1/search",
+        json={"query": query, "n_results": PREROUTE_DOCUMENTS},
+        timeout=PREROUTE_TIMEOUT
+    )
+    response.raise_for_status()
+    # Identifiers (policy or invoice numbers) are kept even when the embedding
+    # is not close, but only if the chunk actually contains one from the query.
+    identifiers = [token.lower() for token in IDENTIFIER_PATTERN.findall(query)]
+    documents = []
+    for result in response.json().get("results", []):
+        distance = result.get("distance")
+        text = (result.get("text") or "").lower()
+        if distance is not None and distance <= PREROUTE_DOC_MAX_DISTANCE:
+            documents.append(result)
+        elif any(identifier in text for identifier in identifiers):
+            documents.append(result)
+    return documents
+
+async def preroute_query(query: str) -> Dict[str, Any]:
+    # Looks up the facts and documents a query most likely needs, so the
+    # first generation can answer directly instead of emitting tool calls.
+    facts, documents = await asyncio.gather(
+        asyncio.wait_for(prefetch_facts_for_query(query), timeout=PREROUTE_TIMEOUT),
+        asyncio.wait_for(prefetch_documents_for_query(query), timeout=PREROUTE_TIMEOUT),
+        return_exceptions=True
+    )
     
-    full_system_prompt = f"{system_prompt}\n\n{persona_prompt}\n\nVerfügbare Tools:\n{tools_description}"
+    if isinstance(facts, BaseException):
+        print(f"Error prefetching facts: {facts}")
+        facts = {}
+    if isinstance(documents, BaseException):
+        print(f"Error prefetching documents: {documents}")
+        documents = []
+    
+    return {"facts": facts, "documents": documents}
+
+def build_prefetched_context(prefetched: Dict[str, Any]) -> Optional[str]:
+    sections = []
+    if prefetched["facts"]:
+        sections.append("Gespeicherte Fakten:\n" + "\n".join(
+            f"- {key}: {value}" for key, value in prefetched["facts"].items()
+        ))
+    if prefetched["documents"]:
+        sections.append("Relevante Dokumente:\n" + format_search_results(prefetched["documents"]))
+    
+    if not sections:
+        return None
+    
+    return (
+        "Vorab geladener Kontext zur folgenden Frage. Wenn er ausreicht, antworte "
+        "direkt ohne Tool-Call; nutze Tools nur für fehlende Informationen.\n\n"
+        + "\n\n".join(sections)
+    )
+
+async def build_messages(
+    query: str,
+    conversation_history: Optional[List[Dict[str, str]]] = None,
+    prefetched: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, str]]:
+    full_system_prompt = await prompt_cache.get_system_prompt()
     
     messages = [{"role": "system", "content": full_system_prompt}]
     
     if conversation_history:
         messages.extend(conversation_history)
     
+    # Placed after the history so the system prompt and earlier turns stay an
+    # unchanged prefix between requests.
+    prefetched_context = build_prefetched_context(prefetched) if prefetched else None
+    if prefetched_context:
+        messages.append({"role": "system", "content": prefetched_context})
+    
     messages.append({"role": "user", "content": query})
     
-    llm_response = call_ollama(messages)
+    return messages
+
+async def prepare_messages(
+    query: str,
+    conversation_history: Optional[List[Dict[str, str]]],
+    preroute: bool
+) -> tuple[List[Dict[str, str]], Dict[str, Any]]:
+    prefetched = {"facts": {}, "documents": []}
+    if preroute and PREROUTE_ENABLED:
+        prefetched = await preroute_query(query)
+    
+    return await build_messages(query, conversation_history, prefetched), prefetched
+
+async def batch_get_facts(keys: List[str]) -> Dict[str, str]:
+    response = await get_http_client().post(
+        f"{TOOLSERVER_URL}/v1/facts:batchGet",
+        json={"keys": keys},
+        timeout=5
+    )
+    response.raise_for_status()
+    data = response.json()
+    return {fact["key"]: fact["value"] for fact in data.get("facts", [])}
+
+async def execute_tool_call_isolated(tool_call: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return await asyncio.wait_for(execute_tool_call(tool_call), timeout=TOOL_CALL_TIMEOUT)
+    except asyncio.TimeoutError:
+        return {"success": False, "error": f"Zeitüberschreitung nach {TOOL_CALL_TIMEOUT:.0f}s"}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+def get_dependency_key(tool_call: Dict[str, Any]) -> Optional[str]:
+    if tool_call.get("function") in ("get_fact", "set_fact"):
+        return f"fact:{tool_call['arguments'].get('key')}"
+    return None
+
+async def execute_tool_calls(tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Calls touching the same fact key run in order inside one chain so a
+    # get_fact sees an earlier set_fact; all chains run concurrently.
+    chains: Dict[str, List[int]] = {}
+    for index, tool_call in enumerate(tool_calls):
+        dependency_key = get_dependency_key(tool_call) or f"call:{index}"
+        chains.setdefault(dependency_key, []).append(index)
     
-    tool_calls = parse_tool_calls(llm_response)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(tool_calls)
     
-    tool_results = []
-    if tool_calls:
-        for tool_call in tool_calls:
-            result = execute_tool_call(tool_call)
-            tool_results.append({
-                "tool_call": tool_call,
-                "result": result
-            })
+    # get_fact calls at the head of a chain cannot depend on a set_fact, so
+    # they are resolved together with a single batch request.
+    prefetch_indices = []
+    for indices in chains.values():
+        for index in indices:
+            if tool_calls[index].get("function") != "get_fact":
+                break
+            prefetch_indices.append(index)
+    
+    async def prefetch_facts() -> None:
+        keys = list(dict.fromkeys(tool_calls[index]["arguments"].get("key") for index in prefetch_indices))
+        try:
+            facts = await asyncio.wait_for(batch_get_facts(keys), timeout=TOOL_CALL_TIMEOUT)
+        except Exception as e:
+            print(f"Batch fact lookup failed, falling back to single calls: {e}")
+            return
         
-        tool_results_text = "\n".join([
-            f"Tool: {tr['tool_call']['function']} -> {tr['result']}"
-            for tr in tool_results
+        # Misses go through the tool itself, which suggests similar keys.
+        missing = [key for key in keys if key not in facts]
+        misses = await asyncio.gather(*[
+            execute_tool_call_isolated({"function": "get_fact", "arguments": {"key": key}})
+            for key in missing
         ])
+        miss_results = dict(zip(missing, misses))
         
-        messages.append({"role": "assistant", "content": llm_response})
-        messages.append({
-            "role": "user",
-            "content": f"Tool-Ergebnisse:\n{tool_results_text}\n\nBitte formuliere jetzt eine finale Antwort für den Benutzer basierend auf diesen Ergebnissen."
-        })
-        
-        final_response = call_ollama(messages)
+        for index in prefetch_indices:
+            key = tool_calls[index]["arguments"].get("key")
+            if key in facts:
+                results[index] = {"success": True, "result": facts[key]}
+            else:
+                results[index] = miss_results[key]
+    
+    prefetch_task = asyncio.ensure_future(prefetch_facts()) if len(prefetch_indices) > 1 else None
+    
+    async def run_chain(indices: List[int]) -> None:
+        if prefetch_task is not None and indices[0] in prefetch_indices:
+            await prefetch_task
         
-        return {
-            "response": final_response,
-            "tool_calls": tool_calls,
-            "tool_results": tool_results,
-            "raw_llm_response": llm_response
-        }
+        for index in indices:
+            if results[index] is None:
+                results[index] = await execute_tool_call_isolated(tool_calls[index])
     
+    await asyncio.gather(*(run_chain(indices) for indices in chains.values()))
+    if prefetch_task is not None:
+        await prefetch_task
+    
+    return [
+        {"tool_call": tool_call, "result": result}
+        for tool_call, result in zip(tool_calls, results)
+    ]
+
+def format_tool_result(result: Dict[str, Any]) -> str:
+    if not result.get("success"):
+        if result.get("candidates"):
+            return f"Fehler: {result.get('error')}. Ähnliche Schlüssel: {', '.join(result['candidates'])}"
+        return f"Fehler: {result.get('error')}"
+    
+    value = result.get("result")
+    if isinstance(value, str):
+        text = value
+    elif isinstance(value, list) and value and all(isinstance(item, dict) and "text" in item for item in value):
+        # Search hits share the budget, so every hit is shown shortened
+        # instead of the first one in full as raw JSON.
+        per_hit = max(TOOL_RESULT_MAX_CHARS // len(value) - 40, 80)
+        text = format_search_results(value, min(SEARCH_RESULT_MAX_CHARS, per_hit))
+    elif isinstance(value, list) and value and all(isinstance(item, dict) and "key" in item for item in value):
+        text = "\n".join(f"- {item['key']}: {item.get('value', '')}" for item in value)
     else:
-        return {
-            "response": llm_response,
-            "tool_calls": [],
-            "tool_results": [],
-            "raw_llm_response": llm_response
+        text = json.dumps(value, ensure_ascii=False)
+    
+    if len(text) > TOOL_RESULT_MAX_CHARS:
+        # Cut at a line break where possible, so no hit is cut in half.
+        cut = text.rfind("\n", 0, TOOL_RESULT_MAX_CHARS)
+        text = text[:cut if cut > 0 else TOOL_RESULT_MAX_CHARS] + " … (gekürzt)"
+    return text
+
+def append_tool_results(
+    messages: List[Dict[str, Any]],
+    assistant_message: Dict[str, Any],
+    tool_results: List[Dict[str, Any]]
+) -> None:
+    messages.append({
+        "role": "assistant",
+        "content": assistant_message.get("content", ""),
+        "tool_calls": [
+            {"function": {"name": tr["tool_call"]["function"], "arguments": tr["tool_call"]["arguments"]}}
+            for tr in tool_results
+        ]
+    })
+    for tr in tool_results:
+        messages.append({"role": "tool", "content": format_tool_result(tr["result"])})
+
+async def embed_query(query: str) -> Optional[List[float]]:
+    if not RESPONSE_CACHE_EMBED_MODEL:
+        return None
+    
+    try:
+        response = await get_http_client().post(
+            f"{OLLAMA_URL}/api/embeddings",
+            json={"model": RESPONSE_CACHE_EMBED_MODEL, "prompt": normalize_query(query)},
+            timeout=10
+        )
+        response.raise_for_status()
+        return response.json().get("embedding") or None
+    except Exception as e:
+        print(f"Error embedding query: {e}")
+        return None
+
+async def facts_unchanged(facts: Dict[str, Optional[str]]) -> bool:
+    # Facts can also change outside the orchestrator (frontend, proactivity),
+    # so a hit is only served if the values it was built from still hold.
+    if not facts:
+        return True
+    
+    try:
+        current = await batch_get_facts(list(facts))
+    except Exception as e:
+        print(f"Error validating cached response: {e}")
+        return False
+    
+    return all(current.get(key) == value for key, value in facts.items())
+
+async def get_cached_response(
+    key: str,
+    context: str,
+    query: str
+) -> tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+    entry = response_cache.get(key)
+    similar = False
+    embedding = None
+    
+    if entry is None:
+        embedding = await embed_query(query)
+        if embedding:
+            match = response_cache.find_similar(context, embedding)
+            if match:
+                key, entry = match
+                similar = True
+    
+    if entry is not None and not await facts_unchanged(entry.facts):
+        response_cache.remove(key)
+        entry = None
+    
+    if entry is None:
+        response_cache.misses += 1
+        return None, embedding
+    
+    if similar:
+        response_cache.similar_hits += 1
+    else:
+        response_cache.hits += 1
+    return entry.result, embedding
+
+def get_cacheable_facts(result: Dict[str, Any]) -> Optional[Dict[str, Optional[str]]]:
+    # Returns the fact values an answer depends on, or None if the answer
+    # must not be replayed: it wrote something or a tool/LLM call failed.
+    if result.get("error"):
+        return None
+    
+    facts: Dict[str, Optional[str]] = dict(result["prefetched"]["facts"])
+    for tool_result in result["tool_results"]:
+        function = tool_result["tool_call"].get("function")
+        key = tool_result["tool_call"]["arguments"].get("key")
+        outcome = tool_result["result"]
+        
+        if function == "get_fact":
+            if outcome.get("success"):
+                facts[key] = outcome.get("result")
+            elif outcome.get("error") == "Fakt nicht gefunden":
+                facts[key] = None
+            else:
+                return None
+        elif function != "search_docs" or not outcome.get("success"):
+            return None
+    
+    return facts
+
+def store_response(key: str, context: str, result: Dict[str, Any], embedding: Optional[List[float]]) -> None:
+    facts = get_cacheable_facts(result)
+    if facts is not None:
+        response_cache.put(key, context, result, facts, embedding)
+
+async def summarize_turns(summary: str, turns: List[Dict[str, str]]) -> str:
+    transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+    message = await call_ollama([
+        {
+            "role": "system",
+            "content": "Fasse das Gespräch knapp in Stichpunkten zusammen. Behalte genannte Fakten, "
+                       "Entscheidungen und offene Fragen, lass Höflichkeiten weg."
+        },
+        {
+            "role": "user",
+            "content": f"Bisherige Zusammenfassung:\n{summary or '-'}\n\nNeue Gesprächsteile:\n{transcript}"
         }
+    ])
+    if message["error"]:
+        raise RuntimeError(message["error"])
+    return message["content"].strip()
+
+def resolve_history(
+    conversation_history: Optional[List[Dict[str, str]]],
+    session: Optional[Session]
+) -> List[Dict[str, str]]:
+    if session is not None:
+        return session_store.context_messages(session)
+    return fit_to_budget(conversation_history or [], CONTEXT_TOKEN_BUDGET)
+
+def remember_turn(session: Optional[Session], query: str, response: str, error: Optional[str] = None) -> None:
+    if session is None or error:
+        return
+    
+    session.append(query, response)
+    if session_store.needs_compaction(session):
+        # Summarizing costs an LLM call, so it runs after the answer is out.
+        task = asyncio.ensure_future(session_store.compact(session, summarize_turns))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+async def process_query(
+    query: str,
+    conversation_history: Optional[List[Dict[str, str]]] = None,
+    use_cache: bool = True,
+    preroute: bool = True,
+    session_id: Optional[str] = None
+) -> Dict[str, Any]:
+    session = session_store.get_or_create(session_id) if session_id else None
+    conversation_history = resolve_history(conversation_history, session)
+    
+    use_cache = use_cache and response_cache.enabled
+    context = context_hash(conversation_history)
+    cache_key = response_cache.key(query, context)
+    embedding = None
+    
+    if use_cache:
+        cached, embedding = await get_cached_response(cache_key, context, query)
+        if cached is not None:
+            remember_turn(session, query, cached["response"])
+            return {**cached, "cached": True, "llm_calls": 0}
+    
+    result = await run_query(query, conversation_history, preroute)
+    
+    if use_cache:
+        store_response(cache_key, context, result, embedding)
+    
+    remember_turn(session, query, result["response"], result["error"])
+    return {**result, "cached": False}
+
+async def run_query(
+    query: str,
+    conversation_history: Optional[List[Dict[str, str]]],
+    preroute: bool
+) -> Dict[str, Any]:
+    messages, prefetched = await prepare_messages(query, conversation_history, preroute)
+    tools = await get_available_tools()
+    
+    all_tool_calls: List[Dict[str, Any]] = []
+    all_tool_results: List[Dict[str, Any]] = []
+    raw_llm_response = None
+    llm_calls = 0
+    
+    # Tools are offered for MAX_TOOL_ROUNDS generations; after that the model
+    # has to answer with what it has gathered.
+    while True:
+        offer_tools = tools if llm_calls < MAX_TOOL_ROUNDS else None
+        message = await call_ollama(messages, offer_tools)
+        llm_calls += 1
+        if raw_llm_response is None:
+            raw_llm_response = message["content"]
+        
+        if not message["tool_calls"]:
+            break
+        
+        tool_results = await execute_tool_calls(message["tool_calls"])
+        append_tool_results(messages, message, tool_results)
+        all_tool_calls.extend(message["tool_calls"])
+        all_tool_results.extend(tool_results)
+    
+    return {
+        "response": message["content"],
+        "tool_calls": all_tool_calls,
+        "tool_results": all_tool_results,
+        "raw_llm_response": raw_llm_response,
+        "prefetched": prefetched,
+        "llm_calls": llm_calls,
+        "error": message["error"]
+    }
+
+async def process_query_stream(
+    query: str,
+    conversation_history: Optional[List[Dict[str, str]]] = None,
+    use_cache: bool = True,
+    preroute: bool = True,
+    session_id: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    session = session_store.get_or_create(session_id) if session_id else None
+    conversation_history = resolve_history(conversation_history, session)
+    
+    use_cache = use_cache and response_cache.enabled
+    context = context_hash(conversation_history)
+    cache_key = response_cache.key(query, context)
+    embedding = None
+    
+    if use_cache:
+        cached, embedding = await get_cached_response(cache_key, context, query)
+        if cached is not None:
+            if cached["tool_calls"]:
+                yield {"type": "tool_calls", "tool_calls": cached["tool_calls"]}
+                yield {"type": "tool_results", "tool_results": cached["tool_results"]}
+            yield {"type": "token", "content": cached["response"]}
+            remember_turn(session, query, cached["response"])
+            yield {
+                "type": "done",
+                "response": cached["response"],
+                "tool_calls": cached["tool_calls"],
+                "tool_results": cached["tool_results"],
+                "cached": True,
+                "llm_calls": 0
+            }
+            return
+    
+    messages, prefetched = await prepare_messages(query, conversation_history, preroute)
+    tools = await get_available_tools()
+    
+    all_tool_calls: List[Dict[str, Any]] = []
+    all_tool_results: List[Dict[str, Any]] = []
+    raw_llm_response = None
+    llm_calls = 0
+    error = None
+    
+    while True:
+        offer_tools = tools if llm_calls < MAX_TOOL_ROUNDS else None
+        content = ""
+        tool_calls: List[Dict[str, Any]] = []
+        
+        async for chunk in call_ollama_stream(messages, offer_tools):
+            if "content" in chunk:
+                content += chunk["content"]
+                yield {"type": "token", "content": chunk["content"]}
+            elif "error" in chunk:
+                error = chunk["error"]
+                yield {"type": "error", "detail": error}
+            else:
+                tool_calls.extend(chunk["tool_calls"])
+        
+        llm_calls += 1
+        if raw_llm_response is None:
+            raw_llm_response = content
+        
+        if error or not tool_calls:
+            break
+        
+        yield {"type": "tool_calls", "tool_calls": tool_calls}
+        
+        tool_results = await execute_tool_calls(tool_calls)
+        yield {"type": "tool_results", "tool_results": tool_results}
+        
+        append_tool_results(messages, {"content": content}, tool_results)
+        all_tool_calls.extend(tool_calls)
+        all_tool_results.extend(tool_results)
+    
+    result = {
+        "response": content,
+        "tool_calls": all_tool_calls,
+        "tool_results": all_tool_results,
+        "raw_llm_response": raw_llm_response,
+        "prefetched": prefetched,
+        "llm_calls": llm_calls,
+        "error": error
+    }
+    # A stream that broke off is neither cached nor kept in the session.
+    if use_cache:
+        store_response(cache_key, context, result, embedding)
+    
+    remember_turn(session, query, content, error)
+    yield {
+        "type": "done",
+        "response": content,
+        "tool_calls": all_tool_calls,
+        "tool_results": all_tool_results,
+        "cached": False,
+        "llm_calls": llm_calls,
+        "error": error
+    }
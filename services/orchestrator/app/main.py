@@ -1,10 +1,21 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
 from typing import List, Optional, Dict, Any
+import json
 import logic
 
-app = FastAPI(title="Jarvis Orchestrator", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logic.get_http_client()
+    
+    yield
+    
+    await logic.close_http_client()
+
+app = FastAPI(title="Jarvis Orchestrator", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,11 +28,18 @@ app.add_middleware(
 class QueryRequest(BaseModel):
     query: str
     conversation_history: Optional[List[Dict[str, str]]] = None
+    stream: bool = False
+    use_cache: bool = True
+    preroute: bool = True
+    session_id: Optional[str] = None
 
 class QueryResponse(BaseModel):
     response: str
     tool_calls: List[Dict[str, Any]]
     tool_results: List[Dict[str, Any]]
+    cached: bool = False
+    llm_calls: int = 0
+    session_id: Optional[str] = None
 
 @app.get("/")
 def root():
@@ -31,18 +49,54 @@ def root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/v1/metrics")
+def get_metrics():
+    return {
+        "response_cache": logic.response_cache.metrics(),
+        "sessions": logic.session_store.metrics()
+    }
+
+@app.post("/v1/sessions")
+async def create_session():
+    return {"session_id": logic.session_store.create().session_id}
+
+@app.get("/v1/sessions/{session_id}")
+async def get_session(session_id: str):
+    session = logic.session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found")
+    return session.to_dict()
+
+@app.delete("/v1/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if not logic.session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found")
+    return {"message": f"Session '{session_id}' deleted successfully"}
+
 @app.post("/v1/query", response_model=QueryResponse)
 async def process_query(request: QueryRequest):
+    if request.stream:
+        return StreamingResponse(
+            stream_query_events(request),
+            media_type="application/x-ndjson"
+        )
+    
     try:
-        result = logic.process_query(
+        result = await logic.process_query(
             query=request.query,
-            conversation_history=request.conversation_history
+            conversation_history=request.conversation_history,
+            use_cache=request.use_cache,
+            preroute=request.preroute,
+            session_id=request.session_id
         )
         
         return QueryResponse(
             response=result["response"],
             tool_calls=result["tool_calls"],
-            tool_results=result["tool_results"]
+            tool_results=result["tool_results"],
+            cached=result["cached"],
+            llm_calls=result["llm_calls"],
+            session_id=request.session_id
         )
     
     except Exception as e:
@@ -50,3 +104,20 @@ async def process_query(request: QueryRequest):
             status_code=500,
             detail=f"Fehler bei der Verarbeitung: {str(e)}"
         )
+
+async def stream_query_events(request: QueryRequest):
+    try:
+        async for event in logic.process_query_stream(
+            query=request.query,
+            conversation_history=request.conversation_history,
+            use_cache=request.use_cache,
+            preroute=request.preroute,
+            session_id=request.session_id
+        ):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+    
+    except Exception as e:
+        yield json.dumps({
+            "type": "error",
+            "detail": f"Fehler bei der Verarbeitung: {str(e)}"
+        }, ensure_ascii=False) + "\n"
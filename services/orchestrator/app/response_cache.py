@@ -0,0 +1,137 @@
+import re
+import json
+import math
+import time
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Set
+
+def normalize_query(query: str) -> str:
+    text = unicodedata.normalize("NFC", query).casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+def context_hash(conversation_history: Optional[List[Dict[str, str]]]) -> str:
+    payload = json.dumps(conversation_history or [], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+class CacheEntry:
+    def __init__(
+        self,
+        context: str,
+        result: Dict[str, Any],
+        facts: Dict[str, Optional[str]],
+        embedding: Optional[List[float]],
+        expires_at: float
+    ):
+        self.context = context
+        self.result = result
+        self.facts = facts
+        self.embedding = embedding
+        self.expires_at = expires_at
+
+class ResponseCache:
+    # Finished answers keyed by normalized query and conversation context.
+    # Each entry remembers the fact values it was built from, so a set_fact
+    # on one of those keys drops it and a hit can be re-validated cheaply.
+    def __init__(self, max_entries: int, ttl: float, similarity_threshold: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.by_fact: Dict[str, Set[str]] = {}
+        
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+    
+    def key(self, query: str, context: str) -> str:
+        return hashlib.sha256(f"{context}|{normalize_query(query)}".encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+    
+    def find_similar(self, context: str, embedding: List[float]) -> Optional[tuple[str, CacheEntry]]:
+        best: Optional[tuple[str, CacheEntry]] = None
+        best_score = self.similarity_threshold
+        now = time.monotonic()
+        for key, entry in self.entries.items():
+            if entry.context != context or entry.embedding is None or entry.expires_at <= now:
+                continue
+            score = cosine_similarity(embedding, entry.embedding)
+            if score >= best_score:
+                best, best_score = (key, entry), score
+        
+        if best is not None:
+            self.entries.move_to_end(best[0])
+        return best
+    
+    def put(
+        self,
+        key: str,
+        context: str,
+        result: Dict[str, Any],
+        facts: Dict[str, Optional[str]],
+        embedding: Optional[List[float]] = None
+    ):
+        if not self.enabled:
+            return
+        
+        self._remove(key)
+        self.entries[key] = CacheEntry(context, result, facts, embedding, time.monotonic() + self.ttl)
+        for fact_key in facts:
+            self.by_fact.setdefault(fact_key, set()).add(key)
+        
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+    
+    def invalidate_fact(self, fact_key: str):
+        for key in self.by_fact.pop(fact_key, set()):
+            if key in self.entries:
+                self._remove(key)
+                self.invalidations += 1
+    
+    def remove(self, key: str):
+        self._remove(key)
+        self.invalidations += 1
+    
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for fact_key in entry.facts:
+            keys = self.by_fact.get(fact_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_fact[fact_key]
+    
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.similar_hits + self.misses
+        return {
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.similar_hits) / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "entries": len(self.entries)
+        }
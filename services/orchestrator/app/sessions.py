@@ -0,0 +1,118 @@
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Any
+
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+Summarize = Callable[[str, List[Dict[str, str]]], Awaitable[str]]
+
+def estimate_tokens(message: Dict[str, Any]) -> int:
+    return len(message.get("content") or "") // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+def fit_to_budget(history: List[Dict[str, str]], token_budget: int) -> List[Dict[str, str]]:
+    # Keeps the most recent messages that fit into the budget, so the prompt
+    # does not grow with the length of the conversation.
+    kept = []
+    used = 0
+    for message in reversed(history):
+        used += estimate_tokens(message)
+        if used > token_budget:
+            break
+        kept.append(message)
+    kept.reverse()
+    
+    # Never start the window with an assistant turn whose question was cut.
+    while kept and kept[0].get("role") != "user":
+        kept.pop(0)
+    return kept
+
+class Session:
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.summary = ""
+        self.turns: List[Dict[str, str]] = []
+        self.updated_at = time.monotonic()
+        self.compact_lock = asyncio.Lock()
+    
+    def context_messages(self, token_budget: int) -> List[Dict[str, str]]:
+        messages = []
+        if self.summary:
+            messages.append({
+                "role": "system",
+                "content": f"Zusammenfassung des bisherigen Gesprächs:\n{self.summary}"
+            })
+        remaining = token_budget - sum(estimate_tokens(message) for message in messages)
+        return messages + fit_to_budget(self.turns, remaining)
+    
+    def append(self, query: str, response: str):
+        self.turns.append({"role": "user", "content": query})
+        self.turns.append({"role": "assistant", "content": response})
+        self.updated_at = time.monotonic()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {"session_id": self.session_id, "summary": self.summary, "history": self.turns}
+
+class SessionStore:
+    # Conversations kept server-side, so clients only send a session id.
+    # Older turns are folded into a running summary once the verbatim part
+    # exceeds its token budget.
+    def __init__(self, max_sessions: int, ttl: float, token_budget: int, recent_budget: int):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.token_budget = token_budget
+        self.recent_budget = recent_budget
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+    
+    def create(self) -> Session:
+        return self.get_or_create(uuid.uuid4().hex)
+    
+    def get(self, session_id: str) -> Optional[Session]:
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        if time.monotonic() - session.updated_at > self.ttl:
+            del self.sessions[session_id]
+            return None
+        self.sessions.move_to_end(session_id)
+        return session
+    
+    def get_or_create(self, session_id: str) -> Session:
+        session = self.get(session_id)
+        if session is None:
+            session = Session(session_id)
+            self.sessions[session_id] = session
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        return session
+    
+    def delete(self, session_id: str) -> bool:
+        return self.sessions.pop(session_id, None) is not None
+    
+    def context_messages(self, session: Session) -> List[Dict[str, str]]:
+        return session.context_messages(self.token_budget)
+    
+    def needs_compaction(self, session: Session) -> bool:
+        return sum(estimate_tokens(turn) for turn in session.turns) > self.recent_budget
+    
+    async def compact(self, session: Session, summarize: Summarize):
+        if session.compact_lock.locked():
+            return
+        
+        async with session.compact_lock:
+            recent = fit_to_budget(session.turns, self.recent_budget)
+            older = session.turns[:len(session.turns) - len(recent)]
+            if not older:
+                return
+            
+            try:
+                session.summary = await summarize(session.summary, older)
+            except Exception as e:
+                # Dropping the turns still keeps the prompt bounded.
+                print(f"Error summarizing session {session.session_id}: {e}")
+            del session.turns[:len(older)]
+    
+    def metrics(self) -> Dict[str, Any]:
+        return {"sessions": len(self.sessions)}
@@ -54,9 +54,12 @@ class RulesEngine:
         
         window_rules = self.rules.get("reminders", {}).get(time_window, [])
         
+        fact_keys = [rule["check_fact"] for rule in window_rules if rule.get("check_fact")]
+        facts = self._get_facts(fact_keys)
+        
         for rule in window_rules:
             try:
-                reminder = self._check_rule(rule, time_window)
+                reminder = self._check_rule(rule, time_window, facts)
                 if reminder:
                     reminders.append(reminder)
             except Exception as e:
@@ -64,21 +67,21 @@ class RulesEngine:
         
         return reminders
     
-    def _check_rule(self, rule: Dict[str, Any], time_window: str) -> Optional[Dict[str, Any]]:
+    def _check_rule(self, rule: Dict[str, Any], time_window: str, facts: Dict[str, Optional[str]]) -> Optional[Dict[str, Any]]:
         rule_type = rule.get("type")
         
         if rule_type == "tax_deadline":
-            return self._check_tax_deadline(rule)
+            return self._check_tax_deadline(rule, facts)
         elif rule_type == "appointment":
-            return self._check_appointment(rule)
+            return self._check_appointment(rule, facts)
         
         return None
     
-    def _check_tax_deadline(self, rule: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def _check_tax_deadline(self, rule: Dict[str, Any], facts: Dict[str, Optional[str]]) -> Optional[Dict[str, Any]]:
         fact_key = rule.get("check_fact", "naechste_steuer_frist")
         days_before = rule.get("days_before", 7)
         
-        fact_value = self._get_fact(fact_key)
+        fact_value = facts.get(fact_key) if fact_key in facts else self._get_fact(fact_key)
         if not fact_value:
             return None
         
@@ -100,11 +103,11 @@ class RulesEngine:
         
         return None
     
-    def _check_appointment(self, rule: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def _check_appointment(self, rule: Dict[str, Any], facts: Dict[str, Optional[str]]) -> Optional[Dict[str, Any]]:
         fact_key = rule.get("check_fact", "naechster_termin")
         hours_before = rule.get("hours_before", 24)
         
-        fact_value = self._get_fact(fact_key)
+        fact_value = facts.get(fact_key) if fact_key in facts else self._get_fact(fact_key)
         if not fact_value:
             return None
         
@@ -152,3 +155,30 @@ class RulesEngine:
             logger.error(f"Error fetching fact {key}: {e}")
         
         return None
+    
+    def _get_facts(self, keys: List[str]) -> Dict[str, Optional[str]]:
+        if not keys:
+            return {}
+        
+        try:
+            response = requests.post(
+                f"{self.toolserver_url}/v1/facts:batchGet",
+                json={"keys": list(dict.fromkeys(keys))},
+                timeout=5
+            )
+            response.raise_for_status()
+            data = response.json()
+            
+            facts: Dict[str, Optional[str]] = {}
+            for key in data.get("missing", []):
+                logger.debug(f"Fact not found: {key}")
+                facts[key] = None
+            
+            for fact in data.get("facts", []):
+                facts[fact["key"]] = fact["value"]
+            
+            return facts
+        except Exception as e:
+            logger.error(f"Error fetching facts {keys}: {e}")
+        
+        return {}
@@ -1,16 +1,220 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker, Session
 from models import Base, Fact
+from fact_cache import fact_cache
+from concurrent.futures import Future
+from datetime import datetime
 import os
-from typing import Optional, List
+import re
+import queue
+import threading
+from typing import Optional, List, Dict, Any, Tuple
 
 FACTS_DB_PATH = os.getenv("FACTS_DB_PATH", "/app/data/facts.db")
+FACTS_DB_POOL_SIZE = int(os.getenv("FACTS_DB_POOL_SIZE", "8"))
+FACTS_DB_MAX_OVERFLOW = int(os.getenv("FACTS_DB_MAX_OVERFLOW", "8"))
+FACTS_DB_BUSY_TIMEOUT_MS = int(os.getenv("FACTS_DB_BUSY_TIMEOUT_MS", "5000"))
+FACTS_DB_SYNCHRONOUS = os.getenv("FACTS_DB_SYNCHRONOUS", "NORMAL")
+FACT_WRITE_BATCH_SIZE = int(os.getenv("FACT_WRITE_BATCH_SIZE", "256"))
 
-engine = create_engine(f"sqlite:///{FACTS_DB_PATH}", connect_args={"check_same_thread": False})
+# Keeps statements well below SQLite's bound-parameter limit.
+BATCH_CHUNK_SIZE = 200
+
+FACT_FIELDS = ("key", "value", "created_at", "updated_at")
+
+FACT_SEARCH_KEY_WEIGHT = float(os.getenv("FACT_SEARCH_KEY_WEIGHT", "2.0"))
+FACT_SEARCH_MIN_MATCH = float(os.getenv("FACT_SEARCH_MIN_MATCH", "0.5"))
+FACT_SEARCH_CANDIDATES = int(os.getenv("FACT_SEARCH_CANDIDATES", "50"))
+
+# Trigram index over key and value, kept in sync by triggers so every write
+# path (the writer thread, upserts, deletes) updates it in the same commit.
+FACT_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS facts_search USING fts5(
+        key, value, content='facts', content_rowid='rowid', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS facts_search_insert AFTER INSERT ON facts BEGIN
+        INSERT INTO facts_search(rowid, key, value) VALUES (new.rowid, new.key, new.value);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS facts_search_delete AFTER DELETE ON facts BEGIN
+        INSERT INTO facts_search(facts_search, rowid, key, value) VALUES ('delete', old.rowid, old.key, old.value);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS facts_search_update AFTER UPDATE ON facts BEGIN
+        INSERT INTO facts_search(facts_search, rowid, key, value) VALUES ('delete', old.rowid, old.key, old.value);
+        INSERT INTO facts_search(rowid, key, value) VALUES (new.rowid, new.key, new.value);
+    END""",
+]
+
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+engine = create_engine(
+    f"sqlite:///{FACTS_DB_PATH}",
+    connect_args={"check_same_thread": False, "timeout": FACTS_DB_BUSY_TIMEOUT_MS / 1000},
+    pool_size=FACTS_DB_POOL_SIZE,
+    max_overflow=FACTS_DB_MAX_OVERFLOW
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+@event.listens_for(engine, "connect")
+def configure_connection(dbapi_connection, connection_record):
+    # WAL lets readers run while the writer commits; NORMAL is durable
+    # against application crashes and only skips an fsync per commit.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={FACTS_DB_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={FACTS_DB_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+def _chunks(items: List, size: int = BATCH_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class FactWriter:
+    # All fact writes go through one thread, so writers never compete for
+    # SQLite's write lock. Requests that queue up while a commit is running
+    # are applied together in the next transaction (group commit).
+    def __init__(self, batch_size: int = FACT_WRITE_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.queue: "queue.Queue[Optional[Tuple[str, Any, Future]]]" = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        
+        self.commits = 0
+        self.operations = 0
+    
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="fact-writer", daemon=True)
+                self.thread.start()
+    
+    def stop(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+    
+    def submit(self, operation: str, payload: Any) -> Any:
+        self.start()
+        future: Future = Future()
+        self.queue.put((operation, payload, future))
+        return future.result()
+    
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._write(batch)
+                    return
+                batch.append(item)
+            
+            self._write(batch)
+    
+    def _write(self, batch: List[Tuple[str, Any, Future]]):
+        db = SessionLocal()
+        try:
+            results = [self._apply(db, operation, payload) for operation, payload, _ in batch]
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            db.close()
+            # One bad request must not fail the others: retry them one by one.
+            if len(batch) > 1:
+                for item in batch:
+                    self._write([item])
+            else:
+                batch[0][2].set_exception(e)
+            return
+        
+        self.commits += 1
+        self.operations += len(batch)
+        
+        try:
+            for (operation, payload, future), result in zip(batch, results):
+                try:
+                    future.set_result(self._finish(db, operation, result))
+                except Exception as e:
+                    future.set_exception(e)
+        finally:
+            db.close()
+    
+    def _apply(self, db: Session, operation: str, payload: Any) -> Any:
+        if operation == "set":
+            now = datetime.utcnow()
+            rows = [
+                {"key": key, "value": value, "created_at": now, "updated_at": now}
+                for key, value in payload.items()
+            ]
+            for chunk in _chunks(rows):
+                stmt = sqlite_insert(Fact).values(chunk)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[Fact.key],
+                    set_={"value": stmt.excluded.value, "updated_at": stmt.excluded.updated_at}
+                )
+                db.execute(stmt)
+            return list(payload.keys())
+        
+        if operation == "delete":
+            deleted = []
+            for chunk in _chunks(list(dict.fromkeys(payload))):
+                existing = [row.key for row in db.query(Fact.key).filter(Fact.key.in_(chunk)).all()]
+                if existing:
+                    db.query(Fact).filter(Fact.key.in_(existing)).delete(synchronize_session=False)
+                    deleted.extend(existing)
+            return deleted
+        
+        raise ValueError(f"Unknown write operation: {operation}")
+    
+    def _finish(self, db: Session, operation: str, result: List[str]) -> Any:
+        if operation == "set":
+            facts = [fact.to_dict() for fact in get_facts(db, result)]
+            for fact in facts:
+                fact_cache.store(fact)
+            return facts
+        
+        for key in result:
+            fact_cache.remove(key)
+        return result
+    
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "commits": self.commits,
+            "operations": self.operations,
+            "operations_per_commit": self.operations / self.commits if self.commits else 0.0,
+            "queued": self.queue.qsize()
+        }
+
+fact_writer = FactWriter()
+
+fact_search_enabled = False
+
+def init_fact_search():
+    global fact_search_enabled
+    try:
+        with engine.begin() as connection:
+            for statement in FACT_SEARCH_DDL:
+                connection.execute(text(statement))
+            # Rowids of the facts table can change on VACUUM, so the index is
+            # rebuilt from the table on startup.
+            connection.execute(text("INSERT INTO facts_search(facts_search) VALUES ('rebuild')"))
+        fact_search_enabled = True
+    except Exception as e:
+        print(f"Fact search unavailable (SQLite without FTS5 trigram support?): {e}")
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    init_fact_search()
+    fact_writer.start()
 
 def get_db():
     db = SessionLocal()
@@ -19,17 +223,8 @@ def get_db():
     finally:
         db.close()
 
-def set_fact(db: Session, key: str, value: str) -> Fact:
-    fact = db.query(Fact).filter(Fact.key == key).first()
-    if fact:
-        fact.value = value
-    else:
-        fact = Fact(key=key, value=value)
-        db.add(fact)
-    
-    db.commit()
-    db.refresh(fact)
-    return fact
+def set_fact(key: str, value: str) -> Dict[str, Any]:
+    return fact_writer.submit("set", {key: value})[0]
 
 def get_fact(db: Session, key: str) -> Optional[Fact]:
     return db.query(Fact).filter(Fact.key == key).first()
@@ -37,10 +232,143 @@ def get_fact(db: Session, key: str) -> Optional[Fact]:
 def list_all_facts(db: Session) -> List[Fact]:
     return db.query(Fact).all()
 
-def delete_fact(db: Session, key: str) -> bool:
-    fact = db.query(Fact).filter(Fact.key == key).first()
-    if fact:
-        db.delete(fact)
-        db.commit()
-        return True
-    return False
+def delete_fact(key: str) -> bool:
+    return bool(fact_writer.submit("delete", [key]))
+
+def read_fact(db: Session, key: str) -> Optional[Dict[str, Any]]:
+    found, fact = fact_cache.get(key)
+    if found:
+        return fact
+    
+    generation = fact_cache.current_generation()
+    row = get_fact(db, key)
+    fact = row.to_dict() if row else None
+    fact_cache.load(key, fact, generation)
+    return fact
+
+def read_facts(db: Session, keys: List[str]) -> List[Dict[str, Any]]:
+    keys = list(dict.fromkeys(keys))
+    cached, missing = fact_cache.get_many(keys)
+    
+    if missing:
+        generation = fact_cache.current_generation()
+        loaded = {row.key: row.to_dict() for row in get_facts(db, missing)}
+        for key in missing:
+            cached[key] = loaded.get(key)
+            fact_cache.load(key, cached[key], generation)
+    
+    return [cached[key] for key in keys if cached[key] is not None]
+
+def read_all_facts(db: Session) -> List[Dict[str, Any]]:
+    facts = fact_cache.get_all()
+    if facts is not None:
+        return facts
+    
+    generation = fact_cache.current_generation()
+    facts = [row.to_dict() for row in list_all_facts(db)]
+    fact_cache.load_all(facts, generation)
+    return facts
+
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    # Smallest string above every key starting with prefix, so a prefix
+    # filter becomes a range scan on the primary key index.
+    while prefix and ord(prefix[-1]) == 0x10FFFF:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    
+    next_char = ord(prefix[-1]) + 1
+    if 0xD800 <= next_char <= 0xDFFF:
+        next_char = 0xE000
+    return prefix[:-1] + chr(next_char)
+
+def list_facts_page(
+    db: Session,
+    prefix: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Tuple[str, ...] = FACT_FIELDS
+) -> List[Dict[str, Any]]:
+    # The key is always selected: it is the sort order and the cursor.
+    fields = ("key",) + tuple(field for field in fields if field != "key")
+    query = db.query(*[getattr(Fact, field) for field in fields])
+    
+    if prefix:
+        query = query.filter(Fact.key >= prefix)
+        upper = _prefix_upper_bound(prefix)
+        if upper is not None:
+            query = query.filter(Fact.key < upper)
+    if after is not None:
+        query = query.filter(Fact.key > after)
+    
+    query = query.order_by(Fact.key)
+    if limit is not None:
+        query = query.limit(limit)
+    
+    facts = []
+    for row in query.all():
+        fact = {}
+        for field, value in zip(fields, row):
+            fact[field] = value.isoformat() if isinstance(value, datetime) else value
+        facts.append(fact)
+    return facts
+
+def _trigrams(text: str) -> List[str]:
+    # Every trigram of every word, so "steuer_frist" still finds
+    # "naechste_steuer_frist".
+    trigrams = []
+    for word in re.split(r"[\W_]+", text):
+        trigrams.extend(word[i:i + 3] for i in range(len(word) - 2))
+    return list(dict.fromkeys(trigrams))
+
+def search_facts(db: Session, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+    if not fact_search_enabled:
+        return []
+    
+    lowered = query.lower()
+    folded = lowered.translate(UMLAUTS)
+    required = _trigrams(folded)
+    trigrams = list(dict.fromkeys(_trigrams(lowered) + required))
+    if not trigrams:
+        return []
+    
+    rows = db.execute(
+        text(
+            "SELECT key, value, bm25(facts_search, :key_weight, 1.0) AS rank "
+            "FROM facts_search WHERE facts_search MATCH :match ORDER BY rank LIMIT :limit"
+        ),
+        {
+            "key_weight": FACT_SEARCH_KEY_WEIGHT,
+            "match": " OR ".join(f'"{trigram}"' for trigram in trigrams),
+            "limit": max(limit, FACT_SEARCH_CANDIDATES)
+        }
+    ).all()
+    
+    # The OR query also matches facts that only share common trigrams
+    # ("ich", "che"); a candidate must contain a minimum share of the query's
+    # trigrams, which is also its score.
+    results = []
+    for row in rows:
+        haystack = f"{row.key} {row.value}".lower().translate(UMLAUTS)
+        share = sum(trigram in haystack for trigram in required) / len(required)
+        if share >= FACT_SEARCH_MIN_MATCH:
+            results.append({"key": row.key, "value": row.value, "score": round(share, 3)})
+    
+    results.sort(key=lambda result: result["score"], reverse=True)
+    return results[:limit]
+
+def get_facts(db: Session, keys: List[str]) -> List[Fact]:
+    facts = []
+    for chunk in _chunks(list(dict.fromkeys(keys))):
+        facts.extend(db.query(Fact).filter(Fact.key.in_(chunk)).all())
+    return facts
+
+def set_facts(values: Dict[str, str]) -> List[Dict[str, Any]]:
+    if not values:
+        return []
+    return fact_writer.submit("set", values)
+
+def delete_facts(keys: List[str]) -> List[str]:
+    if not keys:
+        return []
+    return fact_writer.submit("delete", keys)
@@ -0,0 +1,218 @@
+import os
+import re
+import math
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+DOC_BM25_K1 = float(os.getenv("DOC_BM25_K1", "1.2"))
+DOC_BM25_B = float(os.getenv("DOC_BM25_B", "0.75"))
+DOC_RRF_K = int(os.getenv("DOC_RRF_K", "60"))
+
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+STOPWORDS = frozenset("""
+aber alle als also am an auch auf aus bei bin bis bist da das dass dein deine dem den der des die dir
+du ein eine einem einen einer eines er es fuer hab habe hat ich ihr im in ist ja kann mein meine meinem
+meinen meiner mich mir mit nach nicht noch nur oder sein sich sie sind so ueber um und uns unser von vom
+was wann war welche welcher wer wie wir wird wo zu zum zur
+""".split())
+
+WORD_PATTERN = re.compile(r"[^\W_]+(?:[-/.][^\W_]+)*")
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for word in WORD_PATTERN.findall(text.lower().translate(UMLAUTS)):
+        # Identifiers like policy or invoice numbers (GV-2023-48213) are kept
+        # whole and also split, so both spellings of a query match.
+        parts = re.split(r"[-/.]", word)
+        if len(parts) > 1:
+            tokens.append(word)
+        tokens.extend(part for part in parts if part not in STOPWORDS and (len(part) > 1 or part.isdigit()))
+    return tokens
+
+def _matches_condition(value: Any, condition: Any) -> bool:
+    if not isinstance(condition, dict):
+        return value == condition
+    
+    for operator, operand in condition.items():
+        if operator == "$eq" and value != operand:
+            return False
+        if operator == "$ne" and value == operand:
+            return False
+        if operator == "$in" and value not in operand:
+            return False
+        if operator == "$nin" and value in operand:
+            return False
+        if operator in ("$gt", "$gte", "$lt", "$lte"):
+            if value is None:
+                return False
+            try:
+                if operator == "$gt" and not value > operand:
+                    return False
+                if operator == "$gte" and not value >= operand:
+                    return False
+                if operator == "$lt" and not value < operand:
+                    return False
+                if operator == "$lte" and not value <= operand:
+                    return False
+            except TypeError:
+                return False
+    return True
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    # Same filter syntax as Chroma's `where`, so both retrievers see the same
+    # subset of chunks.
+    if not where:
+        return True
+    
+    for field, condition in where.items():
+        if field == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif field == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif not _matches_condition(metadata.get(field), condition):
+            return False
+    return True
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = DOC_RRF_K) -> List[Tuple[str, float]]:
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class DocIndex:
+    # In-process BM25 index over the chunks stored in Chroma. It is loaded
+    # from the collection on first use and updated by the toolserver's own
+    # document writes. Writes that arrive while a load is reading the
+    # collection are buffered and replayed on top of the loaded snapshot;
+    # every write is idempotent, so replaying one the snapshot already
+    # contains is harmless.
+    def __init__(self, k1: float = DOC_BM25_K1, b: float = DOC_BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.loading = False
+        self.pending_writes: List[Tuple[str, Any]] = []
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.total_length = 0
+        
+        self.searches = 0
+    
+    def start_load(self):
+        with self.lock:
+            self.loading = True
+            self.pending_writes = []
+    
+    def abort_load(self):
+        with self.lock:
+            self.loading = False
+            self.pending_writes = []
+    
+    def replace(self, documents: List[Dict[str, Any]]):
+        with self.lock:
+            self.documents = {}
+            self.postings = {}
+            self.total_length = 0
+            for document in documents:
+                self._add(document)
+            
+            for operation, payload in self.pending_writes:
+                if operation == "add":
+                    for document in payload:
+                        self._add(document)
+                else:
+                    for doc_id in payload:
+                        self._remove(doc_id)
+            
+            self.pending_writes = []
+            self.loading = False
+            self.loaded = True
+    
+    def add(self, documents: List[Dict[str, Any]]):
+        with self.lock:
+            if self.loading:
+                self.pending_writes.append(("add", documents))
+            if self.loaded:
+                for document in documents:
+                    self._add(document)
+    
+    def remove(self, ids: List[str]):
+        with self.lock:
+            if self.loading:
+                self.pending_writes.append(("remove", list(ids)))
+            if self.loaded:
+                for doc_id in ids:
+                    self._remove(doc_id)
+    
+    def _add(self, document: Dict[str, Any]):
+        self._remove(document["id"])
+        terms = Counter(tokenize(document["text"]))
+        self.documents[document["id"]] = {
+            "text": document["text"],
+            "metadata": document.get("metadata") or {},
+            "length": sum(terms.values()),
+            "terms": terms
+        }
+        self.total_length += sum(terms.values())
+        for term, count in terms.items():
+            self.postings.setdefault(term, {})[document["id"]] = count
+    
+    def _remove(self, doc_id: str):
+        document = self.documents.pop(doc_id, None)
+        if document is None:
+            return
+        self.total_length -= document["length"]
+        for term in document["terms"]:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+    
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            document = self.documents.get(doc_id)
+            if document is None:
+                return None
+            return {"id": doc_id, "text": document["text"], "metadata": document["metadata"]}
+    
+    def search(self, query: str, limit: int, where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        with self.lock:
+            self.searches += 1
+            count = len(self.documents)
+            if not count:
+                return []
+            average_length = self.total_length / count
+            
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    length = self.documents[doc_id]["length"]
+                    norm = frequency + self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / norm
+            
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            if where:
+                ranked = [item for item in ranked if matches_where(self.documents[item[0]]["metadata"], where)]
+            return ranked[:limit]
+    
+    def metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "loaded": self.loaded,
+                "documents": len(self.documents),
+                "terms": len(self.postings),
+                "searches": self.searches
+            }
+
+doc_index = DocIndex()
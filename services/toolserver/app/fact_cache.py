@@ -0,0 +1,112 @@
+import os
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+FACT_CACHE_SIZE = int(os.getenv("FACT_CACHE_SIZE", "10000"))
+
+def fact_etag(fact: Dict[str, Any]) -> str:
+    digest = hashlib.sha256(f"{fact['value']}|{fact.get('updated_at')}".encode("utf-8")).hexdigest()
+    return f'"{digest[:16]}"'
+
+class FactCache:
+    # Hot facts (as dicts) in front of SQLite, including "not found" entries.
+    # Writes go through database.py, which updates the cache after commit.
+    # Loads from SQLite are only stored if no write happened meanwhile, so a
+    # slow reader cannot put back a value that was just overwritten.
+    def __init__(self, max_entries: int = FACT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+        self.all_facts: Optional[List[Dict[str, Any]]] = None
+        self.generation = 0
+        self.boot_id = uuid.uuid4().hex[:8]
+        
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, self.entries[key]
+            self.misses += 1
+            return False, None
+    
+    def get_many(self, keys: List[str]) -> Tuple[Dict[str, Optional[Dict[str, Any]]], List[str]]:
+        found = {}
+        missing = []
+        with self.lock:
+            for key in keys:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    found[key] = self.entries[key]
+                    self.hits += 1
+                else:
+                    missing.append(key)
+                    self.misses += 1
+        return found, missing
+    
+    def get_all(self) -> Optional[List[Dict[str, Any]]]:
+        with self.lock:
+            if self.all_facts is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self.all_facts
+    
+    def current_generation(self) -> int:
+        with self.lock:
+            return self.generation
+    
+    def list_etag(self) -> str:
+        with self.lock:
+            return f'"{self.boot_id}-{self.generation}"'
+    
+    def load(self, key: str, fact: Optional[Dict[str, Any]], generation: int):
+        with self.lock:
+            if generation == self.generation:
+                self._set(key, fact)
+    
+    def load_all(self, facts: List[Dict[str, Any]], generation: int):
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.all_facts = facts
+            if len(facts) <= self.max_entries:
+                for fact in facts:
+                    self._set(fact["key"], fact)
+    
+    def store(self, fact: Dict[str, Any]):
+        with self.lock:
+            self.generation += 1
+            self.all_facts = None
+            self._set(fact["key"], fact)
+    
+    def remove(self, key: str):
+        with self.lock:
+            self.generation += 1
+            self.all_facts = None
+            self._set(key, None)
+    
+    def _set(self, key: str, fact: Optional[Dict[str, Any]]):
+        self.entries[key] = fact
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "list_cached": self.all_facts is not None
+            }
+
+fact_cache = FactCache()
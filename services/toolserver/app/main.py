@@ -1,11 +1,16 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Dict, Any, Literal
+import base64
+import hashlib
+import json
 import database
 import tools
 from database import get_db, init_db
+from fact_cache import fact_cache, fact_etag
+from doc_index import doc_index
 
 app = FastAPI(title="Jarvis Toolserver", version="1.0.0")
 
@@ -15,10 +20,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 init_db()
 
+FACT_PAGE_MAX_LIMIT = 1000
+
+TOOL_DEFINITIONS = tools.get_tool_definitions()
+TOOL_DEFINITIONS_ETAG = '"' + hashlib.sha256(
+    json.dumps(TOOL_DEFINITIONS, sort_keys=True).encode("utf-8")
+).hexdigest()[:16] + '"'
+
 class FactRequest(BaseModel):
     value: str
 
@@ -28,49 +41,197 @@ class FactResponse(BaseModel):
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
 
+class FactListItem(BaseModel):
+    key: str
+    value: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+class BatchKeysRequest(BaseModel):
+    keys: List[str]
+
+class BatchSetRequest(BaseModel):
+    facts: Dict[str, str]
+
+class BatchFactsResponse(BaseModel):
+    facts: List[FactResponse]
+    missing: List[str] = []
+
+class BatchDeleteResponse(BaseModel):
+    deleted: List[str]
+    missing: List[str]
+
+class ToolInvocationRequest(BaseModel):
+    arguments: Dict[str, Any] = {}
+
+class FactSearchRequest(BaseModel):
+    query: str
+    limit: int = 5
+
+class FactSearchResult(BaseModel):
+    key: str
+    value: str
+    score: float
+
+class FactSearchResponse(BaseModel):
+    query: str
+    results: List[FactSearchResult]
+
 class SearchRequest(BaseModel):
     query: str
     n_results: int = 5
+    where: Optional[Dict[str, Any]] = None
+    mode: Optional[Literal["hybrid", "vector", "bm25"]] = None
 
 class DocumentRequest(BaseModel):
     text: str
     metadata: Optional[dict] = None
 
+class DocumentBatchRequest(BaseModel):
+    documents: List[DocumentRequest]
+
+class DocumentDeleteRequest(BaseModel):
+    ids: List[str]
+
+class DocumentMetadataRequest(BaseModel):
+    ids: List[str]
+    metadata: Dict[str, Any]
+
 @app.get("/")
 def root():
     return {"service": "Jarvis Toolserver", "status": "running"}
 
 @app.get("/v1/tools")
-def get_tools():
-    return {"tools": tools.get_tool_definitions()}
+def get_tools(request: Request, response: Response):
+    if request.headers.get("if-none-match") == TOOL_DEFINITIONS_ETAG:
+        return Response(status_code=304, headers={"ETag": TOOL_DEFINITIONS_ETAG})
+    
+    response.headers["ETag"] = TOOL_DEFINITIONS_ETAG
+    return {"tools": TOOL_DEFINITIONS}
+
+@app.post("/v1/tools/{name}:invoke")
+def invoke_tool(name: str, request: ToolInvocationRequest, db: Session = Depends(get_db)):
+    if name not in tools.TOOL_HANDLERS:
+        raise HTTPException(status_code=404, detail=f"Tool '{name}' not found")
+    return tools.invoke_tool(db, name, request.arguments)
+
+@app.post("/v1/facts:batchGet", response_model=BatchFactsResponse)
+def batch_get_facts(request: BatchKeysRequest, db: Session = Depends(get_db)):
+    facts = database.read_facts(db, request.keys)
+    found = {fact["key"] for fact in facts}
+    return {
+        "facts": facts,
+        "missing": [key for key in dict.fromkeys(request.keys) if key not in found]
+    }
+
+@app.post("/v1/facts:batchSet", response_model=BatchFactsResponse)
+def batch_set_facts(request: BatchSetRequest):
+    return {"facts": database.set_facts(request.facts)}
+
+@app.post("/v1/facts:batchDelete", response_model=BatchDeleteResponse)
+def batch_delete_facts(request: BatchKeysRequest):
+    deleted = database.delete_facts(request.keys)
+    deleted_keys = set(deleted)
+    return {
+        "deleted": deleted,
+        "missing": [key for key in dict.fromkeys(request.keys) if key not in deleted_keys]
+    }
 
 @app.get("/v1/facts/{key}", response_model=FactResponse)
-def get_fact(key: str, db: Session = Depends(get_db)):
-    fact = database.get_fact(db, key)
+def get_fact(key: str, request: Request, response: Response, db: Session = Depends(get_db)):
+    fact = database.read_fact(db, key)
     if not fact:
         raise HTTPException(status_code=404, detail=f"Fact with key '{key}' not found")
-    return fact.to_dict()
+    
+    etag = fact_etag(fact)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    response.headers["ETag"] = etag
+    return fact
+
+@app.post("/v1/facts:search", response_model=FactSearchResponse)
+def search_facts(request: FactSearchRequest, db: Session = Depends(get_db)):
+    results = database.search_facts(db, request.query, min(request.limit, FACT_PAGE_MAX_LIMIT))
+    return {"query": request.query, "results": results}
 
 @app.put("/v1/facts/{key}", response_model=FactResponse)
-def set_fact(key: str, request: FactRequest, db: Session = Depends(get_db)):
-    fact = database.set_fact(db, key, request.value)
-    return fact.to_dict()
+def set_fact(key: str, request: FactRequest, response: Response):
+    fact = database.set_fact(key, request.value)
+    response.headers["ETag"] = fact_etag(fact)
+    return fact
 
 @app.delete("/v1/facts/{key}")
-def delete_fact(key: str, db: Session = Depends(get_db)):
-    success = database.delete_fact(db, key)
+def delete_fact(key: str):
+    success = database.delete_fact(key)
     if not success:
         raise HTTPException(status_code=404, detail=f"Fact with key '{key}' not found")
     return {"message": f"Fact '{key}' deleted successfully"}
 
-@app.get("/v1/facts", response_model=List[FactResponse])
-def list_facts(db: Session = Depends(get_db)):
-    facts = database.list_all_facts(db)
-    return [fact.to_dict() for fact in facts]
+def encode_cursor(key: str) -> str:
+    return base64.urlsafe_b64encode(key.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> str:
+    # Only cursors produced by encode_cursor are accepted.
+    try:
+        key = base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True).decode("utf-8")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if encode_cursor(key) != cursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+def parse_fields(fields: str) -> tuple:
+    requested = tuple(field.strip() for field in fields.split(",") if field.strip())
+    unknown = [field for field in requested if field not in database.FACT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+@app.get("/v1/facts", response_model=List[FactListItem], response_model_exclude_unset=True)
+def list_facts(
+    request: Request,
+    response: Response,
+    prefix: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=FACT_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    # Taken before reading, so the returned list is never older than its ETag.
+    etag = fact_cache.list_etag()
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    
+    if prefix is None and limit is None and cursor is None and fields is None:
+        return database.read_all_facts(db)
+    
+    page = database.list_facts_page(
+        db,
+        prefix=prefix,
+        after=decode_cursor(cursor) if cursor else None,
+        limit=limit + 1 if limit else None,
+        fields=parse_fields(fields) if fields else database.FACT_FIELDS
+    )
+    
+    # One extra row tells whether another page exists.
+    if limit and len(page) > limit:
+        page = page[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(page[-1]["key"])
+    return page
+
+@app.get("/v1/metrics")
+def get_metrics():
+    return {
+        "fact_cache": fact_cache.metrics(),
+        "fact_writer": database.fact_writer.metrics(),
+        "doc_index": doc_index.metrics()
+    }
 
 @app.post("/v1/search")
 def search_documents(request: SearchRequest):
-    results = tools.search_docs(request.query, request.n_results)
+    results = tools.search_docs(request.query, request.n_results, request.where, request.mode)
     return {"query": request.query, "results": results}
 
 @app.post("/v1/documents")
@@ -80,6 +241,27 @@ def add_document(request: DocumentRequest):
         raise HTTPException(status_code=500, detail="Failed to add document")
     return {"message": "Document added successfully"}
 
+@app.post("/v1/documents:batch")
+def add_documents(request: DocumentBatchRequest):
+    ids = tools.add_documents([document.model_dump() for document in request.documents])
+    if ids is None:
+        raise HTTPException(status_code=500, detail="Failed to add documents")
+    return {"message": f"{len(ids)} documents added successfully", "ids": ids}
+
+@app.post("/v1/documents:batchDelete")
+def delete_documents(request: DocumentDeleteRequest):
+    success = tools.delete_documents(request.ids)
+    if not success:
+        raise HTTPException(status_code=500, detail="Failed to delete documents")
+    return {"message": f"{len(request.ids)} documents deleted successfully"}
+
+@app.post("/v1/documents:batchUpdateMetadata")
+def update_documents_metadata(request: DocumentMetadataRequest):
+    success = tools.update_documents_metadata(request.ids, request.metadata)
+    if not success:
+        raise HTTPException(status_code=500, detail="Failed to update documents")
+    return {"message": f"{len(request.ids)} documents updated successfully"}
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
@@ -2,10 +2,34 @@ import chromadb
 from chromadb.config import Settings
 import os
 import time
-from typing import List, Dict
+import inspect
+import threading
+import requests
+from typing import List, Dict, Callable, Any, Optional
+from sqlalchemy.orm import Session
+import database
+from doc_index import doc_index, reciprocal_rank_fusion
 
 CHROMA_HOST = os.getenv("CHROMA_HOST", "http://chroma:8000")
 CHROMA_COLLECTION = os.getenv("CHROMA_COLLECTION", "jarvis_docs")
+DOC_SEARCH_MODE = os.getenv("DOC_SEARCH_MODE", "hybrid")
+DOC_SEARCH_CANDIDATES = int(os.getenv("DOC_SEARCH_CANDIDATES", "20"))
+DOC_INDEX_SYNC_INTERVAL = float(os.getenv("DOC_INDEX_SYNC_INTERVAL", "300"))
+DOC_INDEX_LOAD_BATCH = int(os.getenv("DOC_INDEX_LOAD_BATCH", "1000"))
+DOC_RERANK_MODEL = os.getenv("DOC_RERANK_MODEL", "")
+DOC_RERANK_CANDIDATES = int(os.getenv("DOC_RERANK_CANDIDATES", "20"))
+
+_chroma_client = None
+_collection = None
+_chroma_lock = threading.Lock()
+# Raised by the Chroma HTTP client when the server cannot be reached.
+CHROMA_CONNECTION_ERRORS = (ConnectionError, requests.exceptions.ConnectionError)
+
+_reranker = None
+_reranker_failed = False
+_reranker_lock = threading.Lock()
+_doc_index_lock = threading.Lock()
+_doc_index_checked_at: Optional[float] = None
 
 def get_chroma_client():
     host = CHROMA_HOST.replace("http://", "").replace("https://", "").split(":")[0]
@@ -37,54 +61,260 @@ def get_chroma_client():
                 raise
 
 def get_or_create_collection():
-    client = get_chroma_client()
+    global _chroma_client, _collection
+    if _collection is not None:
+        return _collection
+    
+    with _chroma_lock:
+        if _collection is None:
+            if _chroma_client is None:
+                _chroma_client = get_chroma_client()
+            try:
+                _collection = _chroma_client.get_collection(name=CHROMA_COLLECTION)
+            except Exception as e:
+                print(f"Collection not found, creating new one: {e}")
+                _collection = _chroma_client.create_collection(
+                    name=CHROMA_COLLECTION,
+                    metadata={"description": "Jarvis document collection"}
+                )
+    return _collection
+
+def reset_chroma_connection(keep_client: bool = False):
+    global _chroma_client, _collection
+    with _chroma_lock:
+        if not keep_client:
+            _chroma_client = None
+        _collection = None
+
+def is_chroma_healthy() -> bool:
+    client = _chroma_client
+    if client is None:
+        return False
     try:
-        collection = client.get_collection(name=CHROMA_COLLECTION)
-    except Exception as e:
-        print(f"Collection not found, creating new one: {e}")
-        collection = client.create_collection(
-            name=CHROMA_COLLECTION,
-            metadata={"description": "Jarvis document collection"}
-        )
-    return collection
-
-def search_docs(query: str, n_results: int = 5) -> List[Dict]:
+        client.heartbeat()
+        return True
+    except Exception:
+        return False
+
+def with_collection(operation: Callable[[Any], Any]) -> Any:
+    # Only connection errors are retried. Writes pass their own ids, so an
+    # add that reached Chroma before the connection dropped is not duplicated.
+    try:
+        return operation(get_or_create_collection())
+    except CHROMA_CONNECTION_ERRORS as e:
+        # Retry once: with a fresh collection handle if Chroma is still
+        # reachable, otherwise with a fresh client.
+        healthy = is_chroma_healthy()
+        if not healthy:
+            print(f"Chroma connection lost, reconnecting: {e}")
+        reset_chroma_connection(keep_client=healthy)
+        return operation(get_or_create_collection())
+
+def load_doc_index():
+    doc_index.start_load()
     try:
-        collection = get_or_create_collection()
-        results = collection.query(
-            query_texts=[query],
-            n_results=n_results
-        )
-        
         documents = []
-        if results and results['documents']:
-            for i, doc in enumerate(results['documents'][0]):
+        offset = 0
+        while True:
+            batch = with_collection(lambda collection: collection.get(
+                include=["documents", "metadatas"],
+                limit=DOC_INDEX_LOAD_BATCH,
+                offset=offset
+            ))
+            for i, doc_id in enumerate(batch["ids"]):
                 documents.append({
-                    "text": doc,
-                    "metadata": results['metadatas'][0][i] if results['metadatas'] else {},
-                    "distance": results['distances'][0][i] if results['distances'] else None
+                    "id": doc_id,
+                    "text": batch["documents"][i] or "",
+                    "metadata": batch["metadatas"][i] if batch["metadatas"] else {}
                 })
+            if len(batch["ids"]) < DOC_INDEX_LOAD_BATCH:
+                break
+            offset += DOC_INDEX_LOAD_BATCH
+    except Exception:
+        doc_index.abort_load()
+        raise
+    
+    doc_index.replace(documents)
+
+def sync_doc_index():
+    # Documents are normally indexed when they are added through this
+    # service; the periodic count check picks up changes made elsewhere.
+    # Loads and checks, including failed ones, run at most once per
+    # DOC_INDEX_SYNC_INTERVAL, and searches never wait for a running load.
+    global _doc_index_checked_at
+    if not _doc_index_lock.acquire(blocking=False):
+        return
+    try:
+        now = time.monotonic()
+        if _doc_index_checked_at is not None and now - _doc_index_checked_at < DOC_INDEX_SYNC_INTERVAL:
+            return
+        _doc_index_checked_at = now
         
+        if not doc_index.loaded or with_collection(lambda collection: collection.count()) != len(doc_index.documents):
+            load_doc_index()
+    except Exception as e:
+        print(f"Error loading document index, retrying in {DOC_INDEX_SYNC_INTERVAL:.0f}s: {e}")
+    finally:
+        _doc_index_lock.release()
+
+def get_reranker():
+    global _reranker, _reranker_failed
+    if not DOC_RERANK_MODEL or _reranker_failed:
+        return None
+    if _reranker is not None:
+        return _reranker
+    
+    with _reranker_lock:
+        if _reranker is None and not _reranker_failed:
+            try:
+                from sentence_transformers import CrossEncoder
+                _reranker = CrossEncoder(DOC_RERANK_MODEL, device="cpu")
+            except Exception as e:
+                print(f"Failed to load rerank model {DOC_RERANK_MODEL}, using fused ranking: {e}")
+                _reranker_failed = True
+    return _reranker
+
+def rerank(query: str, documents: List[Dict]) -> List[Dict]:
+    reranker = get_reranker()
+    if reranker is None or len(documents) < 2:
         return documents
+    
+    scores = reranker.predict([(query, document["text"]) for document in documents])
+    for document, score in zip(documents, scores):
+        document["rerank_score"] = float(score)
+    return sorted(documents, key=lambda document: document["rerank_score"], reverse=True)
+
+def search_docs(
+    query: str,
+    n_results: int = 5,
+    where: Optional[Dict[str, Any]] = None,
+    mode: Optional[str] = None
+) -> List[Dict]:
+    # Hybrid retrieval: the embedding search finds paraphrases, the BM25
+    # index finds exact terms (policy numbers, invoice IDs). Both rankings
+    # are merged by reciprocal-rank fusion and optionally reranked.
+    mode = mode or DOC_SEARCH_MODE
+    candidates = max(n_results, DOC_SEARCH_CANDIDATES)
+    try:
+        hits: Dict[str, Dict] = {}
+        rankings = []
+        
+        if mode in ("hybrid", "vector"):
+            results = with_collection(lambda collection: collection.query(
+                query_texts=[query],
+                n_results=candidates,
+                where=where or None
+            ))
+            ranking = []
+            if results and results['ids']:
+                for i, doc_id in enumerate(results['ids'][0]):
+                    hits[doc_id] = {
+                        "id": doc_id,
+                        "text": results['documents'][0][i] if results['documents'] else "",
+                        "metadata": results['metadatas'][0][i] if results['metadatas'] else {},
+                        "distance": results['distances'][0][i] if results['distances'] else None
+                    }
+                    ranking.append(doc_id)
+            rankings.append(ranking)
+        
+        if mode in ("hybrid", "bm25"):
+            sync_doc_index()
+            ranking = []
+            for doc_id, score in doc_index.search(query, candidates, where):
+                if doc_id not in hits:
+                    document = doc_index.get(doc_id)
+                    if document is None:
+                        continue
+                    hits[doc_id] = {**document, "distance": None}
+                hits[doc_id]["bm25_score"] = round(score, 4)
+                ranking.append(doc_id)
+            rankings.append(ranking)
+        
+        documents = []
+        for doc_id, score in reciprocal_rank_fusion(rankings):
+            documents.append({**hits[doc_id], "score": round(score, 6)})
+        
+        if DOC_RERANK_MODEL:
+            documents = rerank(query, documents[:max(n_results, DOC_RERANK_CANDIDATES)])
+        
+        return documents[:n_results]
     except Exception as e:
         return [{"error": str(e)}]
 
 def add_document(text: str, metadata: Dict = None) -> bool:
     try:
-        collection = get_or_create_collection()
         import uuid
         doc_id = str(uuid.uuid4())
         
-        collection.add(
+        with_collection(lambda collection: collection.add(
             documents=[text],
             metadatas=[metadata or {}],
             ids=[doc_id]
-        )
+        ))
+        doc_index.add([{"id": doc_id, "text": text, "metadata": metadata or {}}])
         return True
     except Exception as e:
         print(f"Error adding document: {e}")
         return False
 
+def add_documents(documents: List[Dict]) -> Optional[List[str]]:
+    if not documents:
+        return []
+    
+    try:
+        import uuid
+        doc_ids = [str(uuid.uuid4()) for _ in documents]
+        
+        with_collection(lambda collection: collection.add(
+            documents=[document["text"] for document in documents],
+            metadatas=[document.get("metadata") or {} for document in documents],
+            ids=doc_ids
+        ))
+        doc_index.add([
+            {"id": doc_id, "text": document["text"], "metadata": document.get("metadata") or {}}
+            for doc_id, document in zip(doc_ids, documents)
+        ])
+        return doc_ids
+    except Exception as e:
+        print(f"Error adding documents: {e}")
+        return None
+
+def delete_documents(ids: List[str]) -> bool:
+    if not ids:
+        return True
+    
+    try:
+        with_collection(lambda collection: collection.delete(ids=ids))
+        doc_index.remove(ids)
+        return True
+    except Exception as e:
+        print(f"Error deleting documents: {e}")
+        return False
+
+def update_documents_metadata(ids: List[str], metadata: Dict) -> bool:
+    # Merges metadata into existing chunks, e.g. the new path of a moved file.
+    if not ids:
+        return True
+    
+    try:
+        results = with_collection(lambda collection: collection.get(ids=ids, include=["documents", "metadatas"]))
+        documents = [
+            {"id": doc_id, "text": text, "metadata": {**(current or {}), **metadata}}
+            for doc_id, text, current in zip(results["ids"], results["documents"], results["metadatas"])
+        ]
+        if not documents:
+            return True
+        
+        with_collection(lambda collection: collection.update(
+            ids=[document["id"] for document in documents],
+            metadatas=[document["metadata"] for document in documents]
+        ))
+        doc_index.add(documents)
+        return True
+    except Exception as e:
+        print(f"Error updating documents: {e}")
+        return False
+
 def get_tool_definitions() -> List[Dict]:
     return [
         {
@@ -119,9 +349,28 @@ def get_tool_definitions() -> List[Dict]:
                 "required": ["key", "value"]
             }
         },
+        {
+            "name": "search_facts",
+            "description": "Sucht gespeicherte Fakten unscharf nach Schlüssel und Wert, wenn der genaue Schlüssel unbekannt ist",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "Suchbegriff oder vermuteter Schlüssel (z.B. 'steuer frist')"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Maximale Anzahl Treffer (Standard: 5)",
+                        "default": 5
+                    }
+                },
+                "required": ["query"]
+            }
+        },
         {
             "name": "search_docs",
-            "description": "Durchsucht die Dokumentensammlung semantisch nach relevanten Informationen",
+            "description": "Durchsucht die Dokumentensammlung nach relevanten Informationen (semantisch und nach exakten Begriffen wie Policen- oder Rechnungsnummern)",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -133,9 +382,61 @@ def get_tool_definitions() -> List[Dict]:
                         "type": "integer",
                         "description": "Anzahl der Ergebnisse (Standard: 5)",
                         "default": 5
+                    },
+                    "where": {
+                        "type": "object",
+                        "description": "Optionaler Filter auf Metadaten im Chroma-Format (z.B. {\"filename\": \"police.pdf\"})"
                     }
                 },
                 "required": ["query"]
             }
         }
     ]
+
+def _invoke_get_fact(db: Session, key: str) -> Dict[str, Any]:
+    fact = database.read_fact(db, key)
+    if not fact:
+        # Close matches let the LLM retry with the right key instead of guessing.
+        candidates = [candidate["key"] for candidate in database.search_facts(db, key, limit=3)]
+        return {"success": False, "error": "Fakt nicht gefunden", "candidates": candidates}
+    return {"success": True, "result": fact["value"]}
+
+def _invoke_set_fact(db: Session, key: str, value: str) -> Dict[str, Any]:
+    database.set_fact(key, value)
+    return {"success": True, "result": "Fakt gespeichert"}
+
+def _invoke_search_facts(db: Session, query: str, limit: int = 5) -> Dict[str, Any]:
+    results = database.search_facts(db, query, limit)
+    if not results:
+        return {"success": True, "result": "Keine passenden Fakten gefunden"}
+    return {"success": True, "result": results}
+
+def _invoke_search_docs(
+    db: Session,
+    query: str,
+    n_results: int = 5,
+    where: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    results = search_docs(query, n_results, where)
+    if results and "error" in results[0]:
+        return {"success": False, "error": results[0]["error"]}
+    if not results:
+        return {"success": True, "result": "Keine Dokumente gefunden"}
+    return {"success": True, "result": results}
+
+TOOL_HANDLERS: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "get_fact": _invoke_get_fact,
+    "set_fact": _invoke_set_fact,
+    "search_facts": _invoke_search_facts,
+    "search_docs": _invoke_search_docs,
+}
+
+def invoke_tool(db: Session, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    handler = TOOL_HANDLERS[name]
+    try:
+        inspect.signature(handler).bind(db, **arguments)
+    except TypeError as e:
+        # Wrong or missing arguments are reported to the caller like any other
+        # tool error, so the LLM can correct the call.
+        return {"success": False, "error": f"Ungültige Argumente für {name}: {e}"}
+    return handler(db, **arguments)
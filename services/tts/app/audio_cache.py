@@ -0,0 +1,127 @@
+import os
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+class AudioCache:
+    def __init__(self, model_name: str, cache_dir: str, memory_limit_bytes: int, disk_limit_bytes: int):
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.memory_limit_bytes = memory_limit_bytes
+        self.disk_limit_bytes = disk_limit_bytes
+        self.lock = threading.Lock()
+        
+        self.memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self.memory_bytes = 0
+        self.disk: "OrderedDict[str, int]" = OrderedDict()
+        self.disk_bytes = 0
+        
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        if self.disk_limit_bytes > 0:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._load_disk_index()
+    
+    def _load_disk_index(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pcm"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        
+        for _, key, size in sorted(entries):
+            self.disk[key] = size
+            self.disk_bytes += size
+        self._evict_disk()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pcm")
+    
+    def key(self, text: str, speed: float) -> str:
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        return hashlib.sha256(f"{self.model_name}|{speed:.3f}|{normalized}".encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+            
+            if key in self.disk:
+                try:
+                    with open(self._path(key), "rb") as file:
+                        data = file.read()
+                    os.utime(self._path(key))
+                    self.disk.move_to_end(key)
+                    self.disk_hits += 1
+                    self._put_memory(key, data)
+                    return data
+                except OSError:
+                    self.disk_bytes -= self.disk.pop(key)
+            
+            self.misses += 1
+            return None
+    
+    def contains(self, key: str) -> bool:
+        with self.lock:
+            return key in self.memory or key in self.disk
+    
+    def put(self, key: str, data: bytes):
+        with self.lock:
+            self._put_memory(key, data)
+            
+            if self.disk_limit_bytes > 0 and key not in self.disk and len(data) <= self.disk_limit_bytes:
+                temp_path = self._path(key) + ".tmp"
+                try:
+                    with open(temp_path, "wb") as file:
+                        file.write(data)
+                    os.replace(temp_path, self._path(key))
+                except OSError as e:
+                    print(f"Error writing audio cache entry: {e}")
+                    return
+                self.disk[key] = len(data)
+                self.disk_bytes += len(data)
+                self._evict_disk()
+    
+    def _put_memory(self, key: str, data: bytes):
+        if len(data) > self.memory_limit_bytes:
+            return
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return
+        
+        self.memory[key] = data
+        self.memory_bytes += len(data)
+        while self.memory_bytes > self.memory_limit_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+    
+    def _evict_disk(self):
+        while self.disk_bytes > self.disk_limit_bytes and self.disk:
+            key, size = self.disk.popitem(last=False)
+            self.disk_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+    
+    def metrics(self) -> dict:
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_entries": len(self.disk),
+                "disk_bytes": self.disk_bytes
+            }
@@ -1,13 +1,73 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-import subprocess
-import tempfile
+from piper import PiperVoice
+from audio_cache import AudioCache
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional, List
+import asyncio
+import io
 import os
+import re
+import struct
 import uuid
+import wave
 
-app = FastAPI(title="Jarvis TTS Service", version="1.0.0")
+PIPER_MODEL = "/app/models/de_DE-thorsten-medium.onnx"
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "2"))
+SENTENCE_SILENCE = float(os.getenv("TTS_SENTENCE_SILENCE", "0.2"))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "/app/cache")
+TTS_CACHE_MEMORY_MB = int(os.getenv("TTS_CACHE_MEMORY_MB", "64"))
+TTS_CACHE_DISK_MB = int(os.getenv("TTS_CACHE_DISK_MB", "512"))
+TTS_PREWARM_PHRASES = os.getenv("TTS_PREWARM_PHRASES", "/app/config/tts_phrases.txt")
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?;:])\s+|\n+')
+
+voice: Optional[PiperVoice] = None
+executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="piper")
+audio_cache = AudioCache(
+    model_name=os.path.basename(PIPER_MODEL),
+    cache_dir=TTS_CACHE_DIR,
+    memory_limit_bytes=TTS_CACHE_MEMORY_MB * 1024 * 1024,
+    disk_limit_bytes=TTS_CACHE_DISK_MB * 1024 * 1024
+)
+
+async def prewarm_cache():
+    if not os.path.exists(TTS_PREWARM_PHRASES):
+        return
+    
+    with open(TTS_PREWARM_PHRASES, "r", encoding="utf-8") as f:
+        phrases = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    
+    loop = asyncio.get_running_loop()
+    for phrase in phrases:
+        key = audio_cache.key(phrase, 1.0)
+        if audio_cache.contains(key):
+            continue
+        try:
+            audio_cache.put(key, await loop.run_in_executor(executor, synthesize_pcm, phrase, 1.0))
+        except Exception as e:
+            print(f"Error pre-warming phrase '{phrase}': {e}")
+    
+    print(f"Pre-warmed TTS cache with {len(phrases)} phrases")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global voice
+    print("Loading Piper voice...")
+    voice = await asyncio.get_running_loop().run_in_executor(executor, PiperVoice.load, PIPER_MODEL)
+    print("Piper voice loaded successfully")
+    
+    prewarm_task = asyncio.create_task(prewarm_cache())
+    
+    yield
+    
+    prewarm_task.cancel()
+    executor.shutdown(wait=False)
+
+app = FastAPI(title="Jarvis TTS Service", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,13 +77,65 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-PIPER_MODEL = "/app/models/de_DE-thorsten-medium.onnx"
-OUTPUT_DIR = "/app/output"
-
 class SpeakRequest(BaseModel):
     text: str
     speed: float = 1.0
 
+def pcm_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+def synthesize_pcm(text: str, speed: float) -> bytes:
+    return b"".join(voice.synthesize_stream_raw(
+        text,
+        length_scale=1.0 / speed,
+        sentence_silence=SENTENCE_SILENCE
+    ))
+
+def wav_stream_header(sample_rate: int, channels: int = 1, sample_width: int = 2) -> bytes:
+    # Length fields are set to the maximum because the total size is not
+    # known while streaming; players read until the connection closes.
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 0xFFFFFFFF, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate,
+        sample_rate * channels * sample_width, channels * sample_width, sample_width * 8,
+        b"data", 0xFFFFFFFF
+    )
+
+async def get_speech_pcm(text: str, speed: float) -> bytes:
+    key = audio_cache.key(text, speed)
+    cached = audio_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    pcm = await asyncio.get_running_loop().run_in_executor(executor, synthesize_pcm, text, speed)
+    audio_cache.put(key, pcm)
+    return pcm
+
+async def stream_speech(sentences: List[str], speed: float):
+    yield wav_stream_header(voice.config.sample_rate)
+    
+    # Synthesize the next sentence while the current one is being sent. If
+    # the client disconnects, the prefetched sentence is dropped.
+    next_audio = asyncio.ensure_future(get_speech_pcm(sentences[0], speed))
+    try:
+        for index in range(len(sentences)):
+            current_audio = next_audio
+            if index + 1 < len(sentences):
+                next_audio = asyncio.ensure_future(get_speech_pcm(sentences[index + 1], speed))
+            yield await current_audio
+    finally:
+        next_audio.cancel()
+
 @app.get("/")
 def root():
     return {"service": "Jarvis TTS", "status": "running"}
@@ -31,51 +143,49 @@ def root():
 @app.get("/health")
 def health_check():
     return {
-        "status": "healthy",
+        "status": "healthy" if voice is not None else "loading",
         "model": "de_DE-thorsten-medium",
         "voice": "thorsten"
     }
 
+@app.get("/v1/metrics")
+def get_metrics():
+    return {"cache": audio_cache.metrics()}
+
 @app.post("/v1/speak")
 async def speak_text(request: SpeakRequest):
     if not request.text or len(request.text.strip()) == 0:
         raise HTTPException(status_code=400, detail="Kein Text angegeben")
     
+    if request.speed <= 0:
+        raise HTTPException(status_code=400, detail="Geschwindigkeit muss größer als 0 sein")
+    
     audio_id = str(uuid.uuid4())
-    output_file = os.path.join(OUTPUT_DIR, f"{audio_id}.wav")
     
     try:
-        cmd = [
-            "piper",
-            "--model", PIPER_MODEL,
-            "--output_file", output_file,
-            "--length_scale", str(1.0 / request.speed)
-        ]
-        
-        process = subprocess.Popen(
-            cmd,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
+        pcm = await get_speech_pcm(request.text, request.speed)
         
-        stdout, stderr = process.communicate(input=request.text)
-        
-        if process.returncode != 0:
-            raise Exception(f"Piper TTS error: {stderr}")
-        
-        if not os.path.exists(output_file):
-            raise Exception("Audio-Datei wurde nicht erstellt")
-        
-        return FileResponse(
-            output_file,
+        return Response(
+            content=pcm_to_wav(pcm, voice.config.sample_rate),
             media_type="audio/wav",
-            filename=f"speech_{audio_id}.wav",
-            background=None
+            headers={"Content-Disposition": f'attachment; filename="speech_{audio_id}.wav"'}
         )
     
     except Exception as e:
-        if os.path.exists(output_file):
-            os.remove(output_file)
         raise HTTPException(status_code=500, detail=f"Fehler bei der Sprachsynthese: {str(e)}")
+
+@app.post("/v1/speak/stream")
+async def speak_text_stream(request: SpeakRequest):
+    if not request.text or len(request.text.strip()) == 0:
+        raise HTTPException(status_code=400, detail="Kein Text angegeben")
+    
+    if request.speed <= 0:
+        raise HTTPException(status_code=400, detail="Geschwindigkeit muss größer als 0 sein")
+    
+    sentences = split_sentences(request.text)
+    
+    return StreamingResponse(
+        stream_speech(sentences, request.speed),
+        media_type="audio/wav",
+        headers={"X-Sample-Rate": str(voice.config.sample_rate)}
+    )